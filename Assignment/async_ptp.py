@@ -0,0 +1,273 @@
+"""
+    asyncio implementation of the PTP sender and receiver
+    Python 3
+    Usage: python3 async_ptp.py sender sender_port receiver_port FileToSend.txt max_win rto [dup_ack_threshold] [--cc reno]
+                                       [--header-version 3] [--mss 1000] [--pace 20M|rtt] [--pace-burst 2]
+                                       [--log text|binary|off] [--metrics FILE.json|FILE.prom] [--metrics-interval SECONDS]
+           python3 async_ptp.py receiver receiver_port sender_port FileReceived.txt flp rlp [--sack K] [--flush-size BYTES]
+                                         [--header-version 3] [--recv-win BYTES] [--mss BYTES] [--ack-every N]
+                                         [--ack-delay MS] [--log text|binary|off] [--metrics FILE.json|FILE.prom]
+                                         [--metrics-interval SECONDS]
+    coding: utf-8
+
+    Notes:
+        Same wire format as sender.py and receiver.py, so every endpoint works with the threaded one.
+        Each endpoint is a DatagramProtocol, the segments are handled in datagram_received and the
+        timeouts are loop.call_later callbacks, all on the event loop thread, so the window and the
+        state are never shared between threads and one process can run many transfers together:
+            await asyncio.gather(run_receiver(9000, 10000, 'a.txt', 0, 0), run_sender(10000, 9000, 'b.txt', 5000, 100))
+"""
+import asyncio
+import argparse  # for the optional arguments
+import socket
+from header_type import HEADER_V3, HEADER_VERSIONS, DEFAULT_MSS, MAX_MSS
+from sender import Sender, DUP_ACK_THRESHOLD, DEFAULT_CONGESTION_CONTROL, CONGESTION_CONTROLS
+from pacer import PACE_BURST, parse_rate
+from event_log import setup_log, LOG_LEVELS, LOG_TEXT
+from metrics import METRICS_INTERVAL
+from sender import CLOSED, ESTABLISHED, CLOSING, FIN_WAIT
+from receiver import Receiver, FLUSH_SIZE, RECV_WIN, ACK_DELAY, LISTEN
+
+
+class TransportSocket:
+    def __init__(self, transport) -> None:
+        '''
+        The BatchSocket send interface on top of an asyncio datagram transport, the transport
+        already queues the datagrams so there is nothing to batch or to resize.
+        '''
+        self.transport = transport
+
+    def send(self, header, payload, address):
+        self.transport.sendto(header + payload, address)
+
+    def send_batch(self, segments, address):
+        for header, payload in segments:
+            self.send(header, payload, address)
+
+    def resize(self, buffer_size):
+        pass
+
+
+class LoopTimers:
+    def __init__(self, loop, after_callback) -> None:
+        '''
+        The TimerScheduler interface on top of loop.call_later, the handles can be cancelled the same way.
+        :param after_callback: called after every timer callback, to act on the state it changed
+        '''
+        self.loop = loop
+        self.after_callback = after_callback
+        self.handles = set()
+
+    def schedule(self, delay, callback, *args):
+        handle = None
+
+        def fire():
+            self.handles.discard(handle)
+            callback(*args)
+            self.after_callback()
+        handle = self.loop.call_later(max(delay, 0), fire)
+        self.handles.add(handle)
+        return handle
+
+    def stop(self):
+        for handle in self.handles:
+            handle.cancel()
+        self.handles.clear()
+
+
+class LoopDelayedAck:
+    '''
+    Mixin for a Receiver on the event loop: the delayed ack is a loop.call_later callback
+    instead of the socket timeout of Receiver.run.
+    '''
+    ack_timer = None
+
+    def delay_ack(self, sender_address):
+        super().delay_ack(sender_address)
+        if self.ack_timer is None:
+            self.ack_timer = asyncio.get_running_loop().call_later(self.ack_delay, self.send_delayed_ack)
+
+    def cancel_delayed_ack(self):
+        super().cancel_delayed_ack()
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+
+
+class AsyncSender(Sender, asyncio.DatagramProtocol):
+    '''
+    The Sender driven by the event loop: instead of ptp_send and ptp_close blocking on the state,
+    pump() does the next step after every ack and every timeout.
+    '''
+
+    # the transport is made by run(), only the timers are ready now
+    def open_transport(self):
+        self.loop = asyncio.get_running_loop()
+        self.timers = LoopTimers(self.loop, self.pump)
+        self.transport = None
+        self.batch_socket = None
+        self.fin_sent = False
+        self.pace_timer = None
+        self.done = self.loop.create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.batch_socket = TransportSocket(transport)
+
+    def datagram_received(self, data, addr):
+        if self.done.done():
+            return
+        self.handle_ack(data)
+        self.pump()
+
+    # no ack comes back from an unreachable receiver, the timers end with a reset
+    def error_received(self, exc):
+        pass
+
+    def pump(self):
+        if self.done.done():
+            return
+        if self.state == ESTABLISHED and self.segment_reader is None:
+            self.data_acked = self.synced
+            self.open_segment_reader()
+            # nothing to send, go to close straight away
+            if not self.segment_reader.has_next():
+                self.state = FIN_WAIT
+        if self.state in [ESTABLISHED, CLOSING] and self.segment_reader.has_next() and self.pace_timer is None:
+            self.send_window()
+            # the pacer holds the next segment back, come back once it has the tokens
+            if self.pacing_delay > 0:
+                self.pace_timer = self.timers.schedule(self.pacing_delay, self.pace_timeout)
+        if self.state == FIN_WAIT and not self.fin_sent:
+            self.fin_sent = True
+            self.send_fin()
+        if self.state == CLOSED:
+            self.finish()
+
+    # pump() runs right after this callback
+    def pace_timeout(self):
+        self.pace_timer = None
+
+    def finish(self):
+        self._is_active = False
+        self.timers.stop()
+        if self.segment_reader is not None:
+            self.segment_reader.close()
+        if self.fined:
+            self.log_stats()
+        if self.metrics_file is not None:
+            self.export_metrics()
+        self.transport.close()
+        self.done.set_result(self.fined)
+
+    # return True once the fin has been acked, False after a reset
+    async def run(self):
+        await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.sender_address)
+        self.ptp_open()
+        return await self.done
+
+
+class AsyncReceiver(LoopDelayedAck, Receiver, asyncio.DatagramProtocol):
+    '''
+    The Receiver driven by the event loop, every datagram goes through handle_segment.
+    '''
+
+    # the transport is made by run()
+    def open_transport(self):
+        self.loop = asyncio.get_running_loop()
+        self.transport = None
+        self.batch_socket = None
+        self.done = self.loop.create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.batch_socket = TransportSocket(transport)
+
+    def datagram_received(self, data, addr):
+        if self.done.done():
+            return
+        if self.handle_segment(data, addr):
+            self.transport.close()
+            self.done.set_result(None)
+
+    def error_received(self, exc):
+        pass
+
+    # write the metrics file now and every metrics_interval until the connection is closed
+    def export_periodically(self):
+        if self.done.done():
+            return
+        self.export_metrics()
+        self.loop.call_later(self.metrics_interval, self.export_periodically)
+
+    async def run(self):
+        self.state = LISTEN
+        await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.server_address)
+        # let the kernel hold a whole receive window of datagrams
+        sock = self.transport.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_win)
+        if self.metrics_file is not None:
+            self.export_periodically()
+        return await self.done
+
+
+async def run_sender(*args, **kwargs):
+    return await AsyncSender(*args, **kwargs).run()
+
+
+async def run_receiver(*args, **kwargs):
+    return await AsyncReceiver(*args, **kwargs).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    endpoints = parser.add_subparsers(dest='endpoint', required=True)
+
+    sender_parser = endpoints.add_parser('sender')
+    sender_parser.add_argument('sender_port', type=int)
+    sender_parser.add_argument('receiver_port', type=int)
+    sender_parser.add_argument('filename')
+    sender_parser.add_argument('max_win', type=int)
+    sender_parser.add_argument('rot', type=int)
+    sender_parser.add_argument('dup_ack_threshold', type=int, nargs='?', default=DUP_ACK_THRESHOLD)
+    sender_parser.add_argument('--cc', choices=list(CONGESTION_CONTROLS), default=DEFAULT_CONGESTION_CONTROL,
+                               help='congestion control algorithm')
+    sender_parser.add_argument('--header-version', type=int, choices=HEADER_VERSIONS, default=HEADER_V3,
+                               help='highest header version offered, 1 keeps the 16 bits seqnos, 3 adds the checksums')
+    sender_parser.add_argument('--mss', type=int, default=DEFAULT_MSS, help=f'segment size offered, up to {MAX_MSS} bytes')
+    sender_parser.add_argument('--pace', type=parse_rate, default=None,
+                               help="pacing rate in bits per second (e.g. 500k, 20M) or 'rtt' to spread the window over the RTT")
+    sender_parser.add_argument('--pace-burst', type=int, default=PACE_BURST,
+                               help='max segments the pacer sends back to back')
+
+    receiver_parser = endpoints.add_parser('receiver')
+    receiver_parser.add_argument('receiver_port', type=int)
+    receiver_parser.add_argument('sender_port', type=int)
+    receiver_parser.add_argument('filename')
+    receiver_parser.add_argument('flp', type=float)
+    receiver_parser.add_argument('rlp', type=float)
+    receiver_parser.add_argument('--sack', type=int, default=0, help='max SACK blocks per ACK, 0 to disable')
+    receiver_parser.add_argument('--flush-size', type=int, default=FLUSH_SIZE,
+                                 help='bytes buffered before writing to the file')
+    receiver_parser.add_argument('--header-version', type=int, choices=HEADER_VERSIONS, default=HEADER_V3,
+                                 help='highest header version accepted, 1 keeps the 16 bits seqnos, 3 adds the checksums')
+    receiver_parser.add_argument('--recv-win', type=int, default=RECV_WIN, help='receive window advertised in the syn ack')
+    receiver_parser.add_argument('--mss', type=int, default=MAX_MSS, help='largest segment size accepted')
+    receiver_parser.add_argument('--ack-every', type=int, default=0,
+                                 help='one cumulative ack every N in order segments, 0 to ack each segment')
+    receiver_parser.add_argument('--ack-delay', type=float, default=ACK_DELAY, help='max ms before a delayed ack is sent')
+    for endpoint_parser in [sender_parser, receiver_parser]:
+        endpoint_parser.add_argument('--log', choices=LOG_LEVELS, default=LOG_TEXT,
+                                     help='text log, binary log (.bin, see event_log.py) or no log')
+        endpoint_parser.add_argument('--metrics', dest='metrics_file', default=None,
+                                     help='file rewritten with the metrics during the transfer, Prometheus text if it ends with .prom')
+        endpoint_parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                                     help='seconds between two writes of the metrics file')
+    args = vars(parser.parse_args())
+
+    endpoint = args.pop('endpoint')
+    event_log = setup_log("Sender_log.txt" if endpoint == 'sender' else "Receiver_log.txt", args.pop('log'))
+    asyncio.run(run_sender(**args, event_log=event_log) if endpoint == 'sender'
+                else run_receiver(**args, event_log=event_log))
+    if event_log is not None:
+        event_log.close()
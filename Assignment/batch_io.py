@@ -0,0 +1,59 @@
+# Batched datagram I/O: drain every datagram already queued per wakeup into preallocated
+# buffers, and send header + payload with scatter-gather so the payload is never copied
+import select
+import socket
+
+# max datagrams handled per wakeup
+MAX_BATCH = 32
+
+
+class BatchSocket:
+    def __init__(self, sock, buffer_size, max_batch=MAX_BATCH) -> None:
+        '''
+        :param sock: the bound UDP socket
+        :param buffer_size: the largest datagram we expect, every buffer of the batch has this size
+        :param max_batch: max number of datagrams returned by one recv_batch()
+        '''
+        self.sock = sock
+        self.max_batch = max_batch
+        self.resize(buffer_size)
+        # sendmsg and MSG_DONTWAIT are missing on some platforms (e.g. Windows)
+        self.can_sendmsg = hasattr(sock, 'sendmsg')
+        self.dontwait = getattr(socket, 'MSG_DONTWAIT', None)
+
+    def resize(self, buffer_size):
+        self.buffer_size = buffer_size
+        self.buffers = [bytearray(buffer_size) for _ in range(self.max_batch)]
+        self.views = [memoryview(buffer) for buffer in self.buffers]
+
+    # block until a datagram comes, then take every other one already queued without blocking,
+    # return a list of (memoryview, address), the views are only valid until the next call
+    def recv_batch(self):
+        size, address = self.sock.recvfrom_into(self.buffers[0])
+        batch = [(self.views[0][:size], address)]
+        # a socket with a timeout waits for it even with MSG_DONTWAIT, so poll it with select instead
+        dontwait = self.dontwait if self.sock.gettimeout() is None else None
+        while len(batch) < self.max_batch:
+            buffer = self.buffers[len(batch)]
+            try:
+                if dontwait is not None:
+                    size, address = self.sock.recvfrom_into(buffer, 0, dontwait)
+                else:
+                    if not select.select([self.sock], [], [], 0)[0]:
+                        break
+                    size, address = self.sock.recvfrom_into(buffer)
+            except BlockingIOError:
+                break
+            batch.append((self.views[len(batch)][:size], address))
+        return batch
+
+    def send(self, header, payload, address):
+        if self.can_sendmsg:
+            self.sock.sendmsg([header, payload], [], 0, address)
+        else:
+            self.sock.sendto(header + payload, address)
+
+    # send a list of (header, payload) one after another in a single pass
+    def send_batch(self, segments, address):
+        for header, payload in segments:
+            self.send(header, payload, address)
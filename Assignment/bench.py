@@ -0,0 +1,175 @@
+"""
+    PTP benchmark: Sender/Receiver pairs through the network emulator over a grid of settings
+    Python 3
+    Usage: python3 bench.py [--sizes 100k,1M,10M] [--windows 10000,50000] [--loss 0,0.01,0.05] [--delay 5]
+                            [--jitter 0] [--rate 0] [--seed 1] [--repeat 1] [--port 9000] [--rot 100]
+                            [--log off] [--sender-args "--cc cubic"] [--receiver-args "--sack 3"]
+                            [--timeout 120] [--output results.csv]
+    coding: utf-8
+
+    Notes:
+        Every run starts a receiver, an emulator and a sender as separate processes, the loss, delay,
+        jitter and rate are applied by the emulator on the segments (the acks only get the delay),
+        the receiver itself drops nothing. The file of each size is made from the seed and so is
+        each emulated link, so two runs of the same grid see the same network. Each run reports:
+            goodput: file size over the sender transfer time (from its metrics file)
+            completion: wall time from the start of the sender to the exit of the receiver
+            retransmissions: total, and by cause (timeout, duplicate ack)
+            cpu: user + system time of the sender and of the receiver
+"""
+import argparse  # for the optional arguments
+import csv
+import filecmp
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# a run which takes longer is killed and reported as failed
+RUN_TIMEOUT = 120
+
+# seconds for the receiver and the emulator to bind their ports
+STARTUP_DELAY = 0.3
+
+UNITS = {'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}
+
+COLUMNS = ['size', 'window', 'loss', 'delay', 'jitter', 'rate', 'seed', 'ok', 'completion_s', 'transfer_s',
+           'goodput_MBps', 'retransmits', 'timeouts', 'dupacks', 'sender_cpu_s', 'receiver_cpu_s']
+
+
+# argparse type: comma separated values, sizes may end with k, M or G
+def parse_list(convert):
+    def parse(text):
+        return [convert(item) for item in text.split(',') if item]
+    return parse
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def make_file(directory, size, seed):
+    filename = os.path.join(directory, f'file_{size}.bin')
+    with open(filename, 'wb') as file:
+        file.write(random.Random(seed).randbytes(size))
+    return filename
+
+
+# wait for the process, kill it after timeout seconds, return (exit code, cpu seconds)
+def wait_process(process, timeout):
+    killer = threading.Timer(timeout, process.kill)
+    killer.start()
+    _, status, usage = os.wait4(process.pid, 0)
+    killer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_utime + usage.ru_stime
+
+
+def run_once(filename, size, window, loss, args):
+    port = args.port
+    receiver_port, relay_port, sender_port = port, port + 1, port + 2
+    directory = tempfile.mkdtemp(prefix='ptp_bench_')
+    output = os.path.join(directory, 'received.bin')
+    forward = f'loss={loss},delay={args.delay},jitter={args.jitter},rate={args.rate}'
+    reverse = f'delay={args.delay},jitter={args.jitter}'
+    receiver = subprocess.Popen([sys.executable, os.path.join(HERE, 'receiver.py'), str(receiver_port),
+                                 str(sender_port), output, '0', '0', '--log', args.log] +
+                                shlex.split(args.receiver_args), cwd=directory, stdout=subprocess.DEVNULL)
+    relay = subprocess.Popen([sys.executable, os.path.join(HERE, 'emulator.py'), str(relay_port),
+                              str(receiver_port), '--seed', str(args.seed), '--forward', forward,
+                              '--reverse', reverse], cwd=directory, stdout=subprocess.DEVNULL)
+    time.sleep(STARTUP_DELAY)
+    start_time = time.monotonic()
+    sender = subprocess.Popen([sys.executable, os.path.join(HERE, 'sender.py'), str(sender_port), str(relay_port),
+                               filename, str(window), str(args.rot), '--log', args.log,
+                               '--metrics', 'sender.json'] + shlex.split(args.sender_args),
+                              cwd=directory, stdout=subprocess.DEVNULL)
+    sender_code, sender_cpu = wait_process(sender, args.timeout)
+    # the receiver exits once it has acked the fin, it may wait for a retransmitted one
+    receiver_code, receiver_cpu = wait_process(receiver, max(args.timeout - (time.monotonic() - start_time), 1))
+    completion = time.monotonic() - start_time
+    relay.terminate()
+    relay.wait()
+
+    ok = sender_code == 0 and receiver_code == 0 and os.path.exists(output) and \
+        filecmp.cmp(filename, output, shallow=False)
+    metrics = {}
+    metrics_file = os.path.join(directory, 'sender.json')
+    if os.path.exists(metrics_file):
+        with open(metrics_file) as file:
+            metrics = json.load(file)
+    transfer = metrics.get('elapsed', completion)
+    retransmits = metrics.get('retransmits', {})
+    # keep the logs of a failed run
+    if ok:
+        shutil.rmtree(directory)
+    else:
+        print(f'run failed, see {directory}', file=sys.stderr)
+    return {
+        'size': size, 'window': window, 'loss': loss, 'delay': args.delay, 'jitter': args.jitter,
+        'rate': args.rate, 'seed': args.seed, 'ok': ok,
+        'completion_s': round(completion, 3),
+        'transfer_s': round(transfer, 3),
+        'goodput_MBps': round(size / transfer / 1e6, 3) if ok and transfer > 0 else 0,
+        'retransmits': metrics.get('gauges', {}).get('retransmitted_segments', ''),
+        'timeouts': retransmits.get('timeout', ''),
+        'dupacks': retransmits.get('dupack', ''),
+        'sender_cpu_s': round(sender_cpu, 3),
+        'receiver_cpu_s': round(receiver_cpu, 3),
+    }
+
+
+def run_grid(args):
+    directory = tempfile.mkdtemp(prefix='ptp_bench_files_')
+    files = {size: make_file(directory, size, args.seed) for size in args.sizes}
+    results = []
+    print(' '.join(f'{column:>14}' for column in COLUMNS), flush=True)
+    for size in args.sizes:
+        for window in args.windows:
+            for loss in args.loss:
+                for repeat in range(args.repeat):
+                    result = run_once(files[size], size, window, loss, args)
+                    results.append(result)
+                    print(' '.join(f'{str(result[column]):>14}' for column in COLUMNS), flush=True)
+    shutil.rmtree(directory)
+    if args.output:
+        with open(args.output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=parse_list(parse_size), default=[100000, 1000000, 10000000],
+                        help='file sizes, e.g. 100k,1M,10M')
+    parser.add_argument('--windows', type=parse_list(int), default=[10000, 50000], help='max_win values in bytes')
+    parser.add_argument('--loss', type=parse_list(float), default=[0, 0.01, 0.05], help='segment loss rates')
+    parser.add_argument('--delay', type=float, default=5, help='one way delay in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='delay variation in ms')
+    parser.add_argument('--rate', default='0', help='link rate in bits per second, e.g. 50M, 0 for no limit')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the files and of the emulated links')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each setting')
+    parser.add_argument('--port', type=int, default=9000, help='receiver port, the emulator and the sender use the next two')
+    parser.add_argument('--rot', type=int, default=100, help='initial retransmission timeout of the sender in ms')
+    parser.add_argument('--log', choices=['text', 'binary', 'off'], default='off', help='log of both endpoints')
+    parser.add_argument('--sender-args', default='', help='extra sender options, e.g. "--cc cubic"')
+    parser.add_argument('--receiver-args', default='', help='extra receiver options, e.g. "--sack 3"')
+    parser.add_argument('--timeout', type=float, default=RUN_TIMEOUT, help='seconds before a run is killed')
+    parser.add_argument('--output', default=None, help='CSV file of the results')
+    args = parser.parse_args()
+
+    results = run_grid(args)
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
@@ -0,0 +1,106 @@
+# Congestion control for the sender window, cwnd and ssthresh are counted in segments
+BETA_RENO = 0.5
+BETA_CUBIC = 0.7
+C_CUBIC = 0.4
+
+INITIAL_CWND = 1
+MIN_SSTHRESH = 2
+
+
+class CongestionControl:
+    '''
+    Base class of every congestion control, the sender calls on_ack() for every newly acked
+    segment, on_loss() on a fast retransmit and on_timeout() when the retransmission timer
+    expires, and never has more than cwnd segments in flight.
+    '''
+    name = 'fixed'
+
+    def __init__(self, max_win) -> None:
+        self.max_win = max_win
+        self.cwnd = max_win
+        self.ssthresh = max_win
+
+    def on_ack(self, now):
+        pass
+
+    def on_loss(self, now):
+        pass
+
+    def on_timeout(self, now):
+        pass
+
+
+class Reno(CongestionControl):
+    name = 'reno'
+
+    def __init__(self, max_win) -> None:
+        super().__init__(max_win)
+        self.cwnd = INITIAL_CWND
+
+    def on_ack(self, now):
+        if self.cwnd < self.ssthresh:
+            # slow start, cwnd doubles every RTT
+            self.cwnd += 1
+        else:
+            # congestion avoidance, cwnd grows one segment every RTT
+            self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_win)
+
+    def on_loss(self, now):
+        self.ssthresh = max(self.cwnd * BETA_RENO, MIN_SSTHRESH)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        self.ssthresh = max(self.cwnd * BETA_RENO, MIN_SSTHRESH)
+        self.cwnd = INITIAL_CWND
+
+
+class Cubic(Reno):
+    name = 'cubic'
+
+    def __init__(self, max_win) -> None:
+        super().__init__(max_win)
+        self.w_max = 0
+        self.k = 0
+        self.epoch_start = None
+
+    def on_ack(self, now):
+        if self.cwnd < self.ssthresh:
+            self.cwnd = min(self.cwnd + 1, self.max_win)
+            return
+        if self.epoch_start is None:
+            # first ack of the congestion avoidance epoch
+            self.epoch_start = now
+            if self.cwnd < self.w_max:
+                self.k = ((self.w_max - self.cwnd) / C_CUBIC) ** (1 / 3)
+            else:
+                self.k = 0
+                self.w_max = self.cwnd
+        t = now - self.epoch_start
+        target = C_CUBIC * (t - self.k) ** 3 + self.w_max
+        if target > self.cwnd:
+            self.cwnd += (target - self.cwnd) / self.cwnd
+        else:
+            self.cwnd += 0.01 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_win)
+
+    def on_loss(self, now):
+        self.w_max = self.cwnd
+        self.epoch_start = None
+        self.ssthresh = max(self.cwnd * BETA_CUBIC, MIN_SSTHRESH)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        self.w_max = self.cwnd
+        self.epoch_start = None
+        self.ssthresh = max(self.cwnd * BETA_CUBIC, MIN_SSTHRESH)
+        self.cwnd = INITIAL_CWND
+
+
+CONGESTION_CONTROLS = {cc.name: cc for cc in [CongestionControl, Reno, Cubic]}
+
+
+def get_congestion_control(name, max_win):
+    if name not in CONGESTION_CONTROLS:
+        raise ValueError(f'unknown congestion control {name}, choose from {", ".join(CONGESTION_CONTROLS)}')
+    return CONGESTION_CONTROLS[name](max_win)
@@ -0,0 +1,212 @@
+"""
+    Network emulator: a UDP relay between the PTP sender and receiver
+    Python 3
+    Usage: python3 emulator.py listen_port receiver_port [--seed N] [--forward SPEC] [--reverse SPEC]
+    coding: utf-8
+
+    Notes:
+        The sender sends to listen_port instead of the receiver port, the relay forwards every
+        segment to receiver_port and every ack back to the sender, each direction through its own
+        emulated link. A link is a list of key=value: loss (probability), delay (ms), jitter (ms,
+        uniform +/-), reorder (probability a segment is held reorder_delay more ms), duplicate
+        (probability), corrupt (probability one byte is changed), rate (bits per second, like 20M)
+        and queue (bytes waiting for the rate, the next ones are dropped):
+            python3 receiver.py 9000 10001 FileReceived.txt 0 0
+            python3 emulator.py 10000 9000 --seed 1 --forward loss=0.01,delay=10,jitter=2,rate=20M --reverse delay=10
+            python3 sender.py 10001 10000 FileToSend.txt 50000 100
+        Each link draws from its own generator seeded by --seed, so the same sequence of datagrams
+        always meets the same losses, delays and reorderings.
+"""
+import asyncio
+import argparse  # for the optional arguments
+import random
+import signal
+from pacer import parse_rate
+
+# extra ms a reordered segment is held back
+REORDER_DELAY = 10
+
+# bytes which may wait for a rate limited link before it drops the next ones
+QUEUE_SIZE = 64 * 1024
+
+LINK_OPTIONS = {'loss': float, 'delay': float, 'jitter': float, 'reorder': float, 'reorder_delay': float,
+                'duplicate': float, 'corrupt': float, 'rate': parse_rate, 'queue': int}
+
+
+# argparse type: comma separated key=value link options
+def parse_link(text):
+    options = {}
+    for item in filter(None, text.split(',')):
+        key, _, value = item.partition('=')
+        if key not in LINK_OPTIONS:
+            raise argparse.ArgumentTypeError(f'unknown link option {key}, expected {", ".join(LINK_OPTIONS)}')
+        options[key] = LINK_OPTIONS[key](value)
+    return options
+
+
+class Link:
+    def __init__(self, loop, rng, loss=0, delay=0, jitter=0, reorder=0, reorder_delay=REORDER_DELAY, duplicate=0,
+                 corrupt=0, rate=0, queue=QUEUE_SIZE) -> None:
+        '''
+        One direction of the emulated network.
+        :param rng: the seeded random generator of this link
+        :param loss: probability a datagram is dropped
+        :param delay: one way delay in ms
+        :param jitter: the delay varies uniformly by up to jitter ms either way
+        :param reorder: probability a datagram is held back reorder_delay more ms, behind the next ones
+        :param duplicate: probability a datagram is delivered twice
+        :param corrupt: probability one random byte of a datagram is changed
+        :param rate: link rate in bytes per second, 0 for no limit
+        :param queue: bytes which may wait for the link rate, the next datagrams are dropped
+        '''
+        self.loop = loop
+        self.rng = rng
+        self.loss = float(loss)
+        self.delay = float(delay)
+        self.jitter = float(jitter)
+        self.reorder = float(reorder)
+        self.reorder_delay = float(reorder_delay)
+        self.duplicate = float(duplicate)
+        self.corrupt = float(corrupt)
+        self.rate = float(rate)
+        self.queue = int(queue)
+        # when the link has sent the datagrams already queued, in loop time
+        self.free_time = 0
+        self.queued = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.queue_drops = 0
+        self.reordered = 0
+        self.duplicated = 0
+        self.corrupted = 0
+
+    # send data to address through transport once the link would have delivered it
+    def send(self, transport, data, address):
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        now = self.loop.time()
+        departure = now
+        if self.rate:
+            if self.queued + len(data) > self.queue:
+                self.queue_drops += 1
+                return
+            # the datagram waits for the ones before it, then takes its own time on the link
+            departure = max(now, self.free_time) + len(data) / self.rate
+            self.free_time = departure
+            self.queued += len(data)
+            self.loop.call_at(departure, self.dequeue, len(data))
+        if self.corrupt and data and self.rng.random() < self.corrupt:
+            data = bytearray(data)
+            data[self.rng.randrange(len(data))] ^= self.rng.randrange(1, 256)
+            data = bytes(data)
+            self.corrupted += 1
+        copies = 1
+        if self.duplicate and self.rng.random() < self.duplicate:
+            copies = 2
+            self.duplicated += 1
+        for copy in range(copies):
+            latency = self.delay
+            if self.jitter:
+                latency += self.rng.uniform(-self.jitter, self.jitter)
+            if self.reorder and self.rng.random() < self.reorder:
+                latency += self.reorder_delay
+                self.reordered += 1
+            arrival = departure + max(latency, 0) / 1000
+            if arrival <= now:
+                transport.sendto(data, address)
+            else:
+                self.loop.call_at(arrival, transport.sendto, data, address)
+        self.forwarded += 1
+
+    def dequeue(self, size):
+        self.queued -= size
+
+    def get_stats(self):
+        return (f'forwarded {self.forwarded}, dropped {self.dropped}, queue drops {self.queue_drops}, '
+                f'reordered {self.reordered}, duplicated {self.duplicated}, corrupted {self.corrupted}')
+
+
+class RelayEndpoint(asyncio.DatagramProtocol):
+    def __init__(self, callback) -> None:
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        self.callback(data, addr)
+
+    # the receiver has gone, the sender times out as on a real network
+    def error_received(self, exc):
+        pass
+
+
+class Relay:
+    def __init__(self, listen_port: int, receiver_port: int, seed: int = None, forward: dict = None,
+                 reverse: dict = None, host: str = '127.0.0.1') -> None:
+        '''
+        :param listen_port: the port the sender sends its segments to
+        :param receiver_port: the port of the receiver
+        :param seed: the seed of the links, None for a random one
+        :param forward: the Link options from the sender to the receiver
+        :param reverse: the Link options from the receiver to the sender
+        '''
+        self.listen_address = (host, int(listen_port))
+        self.receiver_address = (host, int(receiver_port))
+        self.host = host
+        self.seed = seed
+        self.forward_options = forward or {}
+        self.reverse_options = reverse or {}
+        self.forward = None
+        self.reverse = None
+        self.front = None  # the transport the sender talks to
+        self.back = None  # the transport the receiver talks to
+        self.sender_address = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        rng = random.Random(self.seed)
+        # one generator per direction, the acks never change the fate of the segments
+        self.forward = Link(loop, random.Random(rng.random()), **self.forward_options)
+        self.reverse = Link(loop, random.Random(rng.random()), **self.reverse_options)
+        self.front, _ = await loop.create_datagram_endpoint(lambda: RelayEndpoint(self.from_sender),
+                                                            local_addr=self.listen_address)
+        self.back, _ = await loop.create_datagram_endpoint(lambda: RelayEndpoint(self.from_receiver),
+                                                           local_addr=(self.host, 0))
+
+    def from_sender(self, data, addr):
+        self.sender_address = addr
+        self.forward.send(self.back, data, self.receiver_address)
+
+    def from_receiver(self, data, addr):
+        if self.sender_address is not None:
+            self.reverse.send(self.front, data, self.sender_address)
+
+    def close(self):
+        self.front.close()
+        self.back.close()
+
+    def get_stats(self):
+        return f'forward: {self.forward.get_stats()}\nreverse: {self.reverse.get_stats()}'
+
+
+async def run_relay(**options):
+    relay = Relay(**options)
+    await relay.start()
+    stop = asyncio.get_running_loop().create_future()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        asyncio.get_running_loop().add_signal_handler(signum, lambda: stop.done() or stop.set_result(None))
+    await stop
+    relay.close()
+    print(relay.get_stats(), flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('listen_port', type=int, help='the port the sender sends to')
+    parser.add_argument('receiver_port', type=int)
+    parser.add_argument('--seed', type=int, default=None, help='seed of the random choices of the links')
+    parser.add_argument('--forward', type=parse_link, default={},
+                        help='link from the sender to the receiver, e.g. loss=0.01,delay=10,jitter=2,rate=20M')
+    parser.add_argument('--reverse', type=parse_link, default={}, help='link from the receiver to the sender')
+    args = parser.parse_args()
+
+    asyncio.run(run_relay(**vars(args)))
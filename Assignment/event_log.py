@@ -0,0 +1,193 @@
+"""
+    Binary packet log
+    Python 3
+    Usage: python3 event_log.py Sender_log.bin [Sender_log.txt]
+
+    Notes:
+        With --log binary the sender and the receiver record every packet as a fixed size event
+        (monotonic timestamp, action, type, seqno, size) in a preallocated ring buffer, and a
+        background thread writes the ring to the .bin file, so the packet path does no formatting
+        and no file write. The other log lines (the statistics at the end) go in the same file as
+        text records. Running this file converts a .bin log to the usual text log.
+"""
+import logging, sys  # to write the log
+import struct
+import threading
+import time
+from threading import Thread
+from header_type import get_type
+
+# the text log, the binary log, or nothing at all
+LOG_TEXT = 'text'
+LOG_BINARY = 'binary'
+LOG_OFF = 'off'
+LOG_LEVELS = [LOG_TEXT, LOG_BINARY, LOG_OFF]
+
+MAGIC = b'PTPLOG1\n'
+
+# timestamp in ns (8 bytes) + action (1 byte) + type (1 byte) + seqno (4 bytes) + size (4 bytes)
+EVENT = struct.Struct('<qBBII')
+ACTIONS = ['snd', 'rcv', 'drp']
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+# the start of the connection, the time the intervals are measured from
+START = 254
+# a text line, its size is the length of the utf-8 text which follows the event
+TEXT = 255
+
+# events held in memory before the writer catches up, once full new events are dropped
+RING_SIZE = 64 * 1024
+
+# seconds between two writes of the ring to the file
+FLUSH_INTERVAL = 0.2
+
+
+class EventLog:
+    def __init__(self, filename, capacity=RING_SIZE, flush_interval=FLUSH_INTERVAL) -> None:
+        '''
+        :param filename: the binary log file
+        :param capacity: number of events the ring buffer holds
+        :param flush_interval: seconds between two writes of the ring to the file
+        '''
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC)
+        self.capacity = capacity
+        self.ring = bytearray(capacity * EVENT.size)
+        self.head = 0  # number of events written in the ring
+        self.tail = 0  # number of events written to the file
+        self.texts = {}  # type: dict[int, bytes]
+        self.dropped = 0
+        self.started = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.flush_interval = flush_interval
+        self.running = True
+        self.writer = Thread(target=self._run, daemon=True)
+        self.writer.start()
+
+    def _append(self, code, packet_type, seqno, size, text=None):
+        with self.lock:
+            if self.head - self.tail >= self.capacity:
+                self.dropped += 1
+                return
+            index = self.head
+            EVENT.pack_into(self.ring, index % self.capacity * EVENT.size, time.monotonic_ns(), code, packet_type,
+                            seqno, size)
+            if text is not None:
+                self.texts[index] = text
+            self.head += 1
+        # wake the writer early once the ring is half full
+        if index - self.tail == self.capacity // 2:
+            self.wake.set()
+
+    # the packet event, action is 'snd', 'rcv' or 'drp'
+    def log(self, action, packet_type, seqno, size):
+        self._append(ACTION_CODES[action], packet_type, seqno, size)
+
+    # the intervals in the text log are measured from this event
+    def mark_start(self):
+        self.started = True
+        self._append(START, 0, 0, 0)
+
+    def text(self, line):
+        data = line.encode()
+        self._append(TEXT, 0, 0, len(data), data)
+
+    def _run(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.drain()
+
+    # write every event of the ring to the file
+    def drain(self):
+        with self.lock:
+            head = self.head
+            start = self.tail % self.capacity * EVENT.size
+            end = head % self.capacity * EVENT.size
+            if head == self.tail:
+                return
+            if start < end:
+                chunk = bytes(self.ring[start:end])
+            else:
+                chunk = bytes(self.ring[start:]) + bytes(self.ring[:end])
+            first = self.tail
+            self.tail = head
+            texts = self.texts
+            self.texts = {}
+        if not texts:
+            self.file.write(chunk)
+            return
+        # put each text right after its event
+        for index in range(first, head):
+            offset = (index - first) * EVENT.size
+            self.file.write(chunk[offset:offset + EVENT.size])
+            if index in texts:
+                self.file.write(texts[index])
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        self.writer.join()
+        if self.dropped:
+            self.text(f'Number of Log Events Dropped {self.dropped}')
+        self.drain()
+        self.file.close()
+
+
+class EventLogHandler(logging.Handler):
+    # the log lines which are not packets (the statistics) go in the binary log as text
+    def __init__(self, event_log):
+        super().__init__()
+        self.event_log = event_log
+
+    def emit(self, record):
+        self.event_log.text(self.format(record))
+
+
+# configure the log of one endpoint, return the EventLog in binary mode, None otherwise
+def setup_log(filename, level=LOG_TEXT):
+    if level == LOG_OFF:
+        logging.disable(logging.CRITICAL)
+        return None
+    if level == LOG_TEXT:
+        # logging is useful for the log part: https://docs.python.org/3/library/logging.html
+        logging.basicConfig(
+            filename=filename,
+            level=logging.INFO,
+            format='',
+            filemode='w')
+        return None
+    event_log = EventLog(filename.rsplit('.', 1)[0] + '.bin')
+    logging.basicConfig(level=logging.INFO, format='', handlers=[EventLogHandler(event_log)])
+    return event_log
+
+
+# yield the text lines of a binary log, in the format of the text log
+def read_log(filename):
+    with open(filename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{filename} is not a binary PTP log')
+        start = None
+        while True:
+            event = file.read(EVENT.size)
+            if len(event) < EVENT.size:
+                return
+            timestamp, code, packet_type, seqno, size = EVENT.unpack(event)
+            if code == TEXT:
+                yield file.read(size).decode()
+            elif code == START:
+                start = timestamp
+            else:
+                interval = (timestamp - start) / 1e6 if start is not None else 0
+                yield '{:<8}\t{:<10.2f}\t{:<8}\t{:<8}\t{:<8}'.format(ACTIONS[code], interval, get_type(packet_type),
+                                                                   str(seqno), str(size))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("\n===== Error usage, python3 event_log.py Sender_log.bin [Sender_log.txt] ======\n")
+        exit(0)
+    output = open(sys.argv[2], 'w') if len(sys.argv) > 2 else sys.stdout
+    for line in read_log(sys.argv[1]):
+        output.write(line + '\n')
+    output.close()
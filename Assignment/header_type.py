@@ -1,12 +1,191 @@
-# Class header type contain all type the segment
-def get_type(which):
-    types = ['DATA', 'ACK', 'SYN', 'FIN', 'RESET']
-    return types[which]
-
-
-class Htype:
-    DATA = 0
-    ACK = 1
-    SYN = 2
-    FIN = 3
-    RESET = 4
+import hashlib
+import zlib
+
+
+# Class header type contain all type the segment
+def get_type(which):
+    types = ['DATA', 'ACK', 'SYN', 'FIN', 'RESET', 'CORRUPT']
+    return types[which]
+
+
+class Htype:
+    DATA = 0
+    ACK = 1
+    SYN = 2
+    FIN = 3
+    RESET = 4
+    # only used in the logs: a segment dropped by its checksum, its own type can be anything
+    CORRUPT = 5
+
+
+# Header versions, version 1 is the original header: type (2 bytes) + seqno (2 bytes),
+# version 2 use a 32 bits seqno: type (2 bytes) + seqno (4 bytes),
+# version 3 adds a CRC32 of the whole segment: type (2 bytes) + seqno (4 bytes) + checksum (4 bytes),
+# and the FIN carries the digest of all the data.
+# The version is negotiated with the SYN, so the SYN and its ACK always use version 1, their options
+# end with their own CRC32, a RESET uses version 1 unless it comes after a version 3 handshake,
+# so a corrupted segment is never taken for one.
+HEADER_V1 = 1
+HEADER_V2 = 2
+HEADER_V3 = 3
+HEADER_VERSIONS = [HEADER_V1, HEADER_V2, HEADER_V3]
+SEQNO_SIZE = {HEADER_V1: 2, HEADER_V2: 4, HEADER_V3: 4}
+CHECKSUM_SIZE = 4
+
+# max data bytes in one segment, version 1 always use the original 1000 bytes
+DEFAULT_MSS = 1000
+MAX_MSS = 64000
+
+
+def get_seq_space(version):
+    return 2 ** (8 * SEQNO_SIZE[version])
+
+
+def has_checksum(version):
+    return version >= HEADER_V3
+
+
+def get_header_size(version):
+    return 2 + SEQNO_SIZE[version] + (CHECKSUM_SIZE if has_checksum(version) else 0)
+
+
+# the payload is only needed by version 3, its checksum covers the type, the seqno and the payload
+def make_header(header_type, seqno, version=HEADER_V1, payload=b''):
+    header = header_type.to_bytes(2, 'big') + seqno.to_bytes(SEQNO_SIZE[version], 'big')
+    if has_checksum(version):
+        header += zlib.crc32(payload, zlib.crc32(header)).to_bytes(CHECKSUM_SIZE, 'big')
+    return header
+
+
+# split a segment into header type, seqno and payload
+def parse_header(message, version=HEADER_V1):
+    header_size = get_header_size(version)
+    header_type = int.from_bytes(message[0:2], byteorder='big')
+    seqno = int.from_bytes(message[2:2 + SEQNO_SIZE[version]], byteorder='big')
+    return header_type, seqno, message[header_size:]
+
+
+# False if a version 3 segment has been corrupted on the way, the older versions have no checksum
+def verify_checksum(message, version=HEADER_V1):
+    if not has_checksum(version):
+        return True
+    checksum_start = 2 + SEQNO_SIZE[version]
+    checksum_end = checksum_start + CHECKSUM_SIZE
+    checksum = zlib.crc32(message[checksum_end:], zlib.crc32(message[:checksum_start]))
+    return checksum == int.from_bytes(message[checksum_start:checksum_end], byteorder='big')
+
+
+# the options of the syn and the syn ack are followed by a CRC32 of the version 1 header and the options
+def add_options_checksum(header, options):
+    return options + zlib.crc32(options, zlib.crc32(header)).to_bytes(CHECKSUM_SIZE, 'big')
+
+
+# False if the options of a syn or a syn ack have been corrupted, a version 1 one has no options to check
+def verify_options_checksum(message):
+    header_size = get_header_size(HEADER_V1)
+    if len(message) == header_size:
+        return True
+    if len(message) < header_size + CHECKSUM_SIZE:
+        return False
+    checksum = zlib.crc32(message[:-CHECKSUM_SIZE])
+    return checksum == int.from_bytes(message[-CHECKSUM_SIZE:], byteorder='big')
+
+
+# digest of all the data of a connection, sent in the FIN of version 3
+def new_digest():
+    return hashlib.sha256()
+
+
+def get_header_type(message):
+    return int.from_bytes(message[0:2], byteorder='big')
+
+
+# the header version of message once version has been negotiated
+def get_message_version(message, version):
+    header_type = get_header_type(message)
+    if header_type == Htype.SYN or (header_type == Htype.RESET and len(message) <= get_header_size(HEADER_V1)):
+        return HEADER_V1
+    return version
+
+
+# SYN options: the highest header version the sender supports (1 byte) + its full 32 bits
+# initial seqno (4 bytes) + the mss it wants to use (2 bytes), then for a striped transfer the
+# offset of the stripe in the file (8 bytes) + the size of the whole file (8 bytes),
+# a SYN without payload comes from a version 1 only sender
+def pack_syn_options(version, start_seqno, mss=DEFAULT_MSS, stripe=None):
+    options = version.to_bytes(1, 'big') + start_seqno.to_bytes(4, 'big') + mss.to_bytes(2, 'big')
+    if stripe is not None:
+        offset, file_size = stripe
+        options += offset.to_bytes(8, 'big') + file_size.to_bytes(8, 'big')
+    return options
+
+
+# return the offered header version, the initial seqno (None if not sent), the mss and
+# the (offset, file size) of the stripe (None for a whole file)
+def unpack_syn_options(payload):
+    if len(payload) < 5:
+        return HEADER_V1, None, DEFAULT_MSS, None
+    payload = payload[:-CHECKSUM_SIZE]
+    mss = int.from_bytes(payload[5:7], byteorder='big') if len(payload) >= 7 else DEFAULT_MSS
+    stripe = None
+    if len(payload) >= 23:
+        stripe = int.from_bytes(payload[7:15], byteorder='big'), int.from_bytes(payload[15:23], byteorder='big')
+    return payload[0], int.from_bytes(payload[1:5], byteorder='big'), mss, stripe
+
+
+# SYN ACK flags
+# every ack is cumulative: its seqno covers all the data before it
+ACK_CUMULATIVE = 1
+
+SYN_ACK_OPTIONS_SIZE = 9
+
+
+# SYN ACK options: the chosen header version (1 byte) + window scale (1 byte) + window (2 bytes)
+# + the chosen mss (2 bytes) + flags (1 byte) + the max ack delay in ms (2 bytes),
+# the receive window in bytes is window << window scale
+def pack_syn_ack_options(version, recv_win, mss=DEFAULT_MSS, flags=0, ack_delay=0):
+    scale = 0
+    while recv_win >> scale >= 2 ** 16:
+        scale += 1
+    return version.to_bytes(1, 'big') + scale.to_bytes(1, 'big') + (recv_win >> scale).to_bytes(2, 'big') \
+        + mss.to_bytes(2, 'big') + flags.to_bytes(1, 'big') + min(int(ack_delay), 2 ** 16 - 1).to_bytes(2, 'big')
+
+
+# a version 1 ack with the syn ack options and their checksum, the acks of the later versions never have this size
+def is_syn_ack(message):
+    return get_header_type(message) == Htype.ACK \
+        and len(message) == get_header_size(HEADER_V1) + SYN_ACK_OPTIONS_SIZE + CHECKSUM_SIZE
+
+
+# return the chosen header version, the receive window in bytes (None if not advertised), the mss,
+# the flags and the max ack delay
+def unpack_syn_ack_options(payload):
+    if len(payload) < 4:
+        return HEADER_V1, None, DEFAULT_MSS, 0, 0
+    payload = payload[:-CHECKSUM_SIZE]
+    mss = int.from_bytes(payload[4:6], byteorder='big') if len(payload) >= 6 else DEFAULT_MSS
+    flags = payload[6] if len(payload) >= 7 else 0
+    ack_delay = int.from_bytes(payload[7:9], byteorder='big') if len(payload) >= 9 else 0
+    return payload[0], int.from_bytes(payload[2:4], byteorder='big') << payload[1], mss, flags, ack_delay
+
+
+# SACK extension: an ACK may carry the receiver's cumulative ack followed by up to K blocks,
+# each block is the [start, end) seqnos of a range held out of order, every seqno use
+# the size of the negotiated header
+def pack_sack(cumulative_seqno, blocks, version=HEADER_V1):
+    size = SEQNO_SIZE[version]
+    payload = cumulative_seqno.to_bytes(size, 'big')
+    for start, end in blocks:
+        payload += start.to_bytes(size, 'big') + end.to_bytes(size, 'big')
+    return payload
+
+
+def unpack_sack(payload, version=HEADER_V1):
+    size = SEQNO_SIZE[version]
+    cumulative_seqno = int.from_bytes(payload[0:size], byteorder='big')
+    blocks = []
+    for i in range(size, len(payload) - 2 * size + 1, 2 * size):
+        start = int.from_bytes(payload[i:i + size], byteorder='big')
+        end = int.from_bytes(payload[i + size:i + 2 * size], byteorder='big')
+        blocks.append((start, end))
+    return cumulative_seqno, blocks
@@ -0,0 +1,170 @@
+# Per-transfer metrics: throughput over time, histograms (RTT, window occupancy), retransmission
+# causes and time spent in each state, written during the transfer to a JSON or Prometheus text file
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# seconds between two writes of the metrics file
+METRICS_INTERVAL = 1.0
+
+# number of throughput samples kept, one per write
+THROUGHPUT_HISTORY = 120
+
+# upper bounds of the RTT histogram buckets in ms, the last bucket is +Inf
+RTT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# upper bounds of the window occupancy buckets, the segments in flight over the window limit
+OCCUPANCY_BUCKETS = [0.25, 0.5, 0.75, 0.9, 1.0]
+
+# upper bounds of the reorder buffer buckets, in segments held after a hole
+REORDER_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# why a data segment has been sent again
+RETRANSMIT_TIMEOUT = 'timeout'
+RETRANSMIT_DUP_ACK = 'dupack'
+RETRANSMIT_CAUSES = [RETRANSMIT_TIMEOUT, RETRANSMIT_DUP_ACK]
+
+# a file ending with .prom gets the Prometheus text format, any other one JSON
+PROMETHEUS_SUFFIX = '.prom'
+
+
+class Histogram:
+    def __init__(self, bounds) -> None:
+        '''
+        :param bounds: the sorted upper bounds of the buckets, values above the last one go in +Inf
+        '''
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # the cumulative count of every bucket, like the Prometheus buckets
+    def get_buckets(self):
+        buckets = []
+        total = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+    def to_dict(self):
+        return {'buckets': self.get_buckets(), 'sum': self.sum, 'count': self.count}
+
+
+class Metrics:
+    def __init__(self, role, state_names, state, histograms, retransmit_causes=()) -> None:
+        '''
+        :param role: 'sender' or 'receiver', the prefix of the Prometheus metrics
+        :param state_names: the name of every state of the endpoint
+        :param state: the state at start
+        :param histograms: the upper bounds of each histogram, keyed by its name
+        :param retransmit_causes: the retransmissions are counted by cause, none on the receiver
+        '''
+        self.role = role
+        self.state_names = state_names
+        self.start_time = time.monotonic()
+        self.state = state
+        self.state_since = self.start_time
+        self.state_time = {name: 0 for name in state_names.values()}  # type: dict[str, float]
+        self.histograms = {name: Histogram(bounds) for name, bounds in histograms.items()}
+        self.retransmits = {cause: 0 for cause in retransmit_causes}
+        # bytes delivered (acked by the receiver or written in order), the throughput counts them
+        self.bytes = 0
+        self.last_sample_time = self.start_time
+        self.last_sample_bytes = 0
+        self.throughput = deque(maxlen=THROUGHPUT_HISTORY)  # type: deque[tuple[float, float]]
+        # the timer thread and the closing thread may both write the file
+        self.write_lock = threading.Lock()
+
+    def set_state(self, state):
+        now = time.monotonic()
+        self.state_time[self.state_names[self.state]] += now - self.state_since
+        self.state = state
+        self.state_since = now
+
+    def deliver(self, size):
+        self.bytes += size
+
+    def observe(self, name, value):
+        self.histograms[name].observe(value)
+
+    def retransmit(self, cause):
+        self.retransmits[cause] += 1
+
+    # the throughput since the last sample, in bytes per second
+    def sample_throughput(self, now):
+        elapsed = now - self.last_sample_time
+        if elapsed <= 0:
+            return self.throughput[-1][1] if self.throughput else 0
+        rate = (self.bytes - self.last_sample_bytes) / elapsed
+        self.throughput.append((round(now - self.start_time, 3), rate))
+        self.last_sample_time = now
+        self.last_sample_bytes = self.bytes
+        return rate
+
+    # every metric at this time, gauges are the current values of the endpoint (cwnd, counters...)
+    def snapshot(self, gauges):
+        now = time.monotonic()
+        elapsed = now - self.start_time
+        state_time = dict(self.state_time)
+        state = self.state_names[self.state]
+        state_time[state] += now - self.state_since
+        return {
+            'role': self.role,
+            'elapsed': elapsed,
+            'state': state,
+            'time_in_state': state_time,
+            'bytes': self.bytes,
+            'throughput': self.sample_throughput(now),
+            'average_throughput': self.bytes / elapsed if elapsed > 0 else 0,
+            'throughput_history': list(self.throughput),
+            'retransmits': dict(self.retransmits),
+            'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            'gauges': gauges,
+        }
+
+    # write the snapshot to filename, a reader never sees a half written file
+    def write(self, filename, gauges):
+        with self.write_lock:
+            snapshot = self.snapshot(gauges)
+            if filename.endswith(PROMETHEUS_SUFFIX):
+                text = to_prometheus(snapshot)
+            else:
+                text = json.dumps(snapshot, indent=1)
+            temp = filename + '.tmp'
+            with open(temp, 'w') as file:
+                file.write(text)
+            os.replace(temp, filename)
+
+
+# the Prometheus text exposition format of a snapshot
+def to_prometheus(snapshot):
+    prefix = f'ptp_{snapshot["role"]}_'
+    lines = [
+        f'{prefix}elapsed_seconds {snapshot["elapsed"]:.3f}',
+        f'{prefix}bytes_total {snapshot["bytes"]}',
+        f'{prefix}throughput_bytes_per_second {snapshot["throughput"]:.1f}',
+        f'{prefix}average_throughput_bytes_per_second {snapshot["average_throughput"]:.1f}',
+    ]
+    for state, seconds in snapshot['time_in_state'].items():
+        lines.append(f'{prefix}state{{state="{state}"}} {int(state == snapshot["state"])}')
+        lines.append(f'{prefix}state_seconds_total{{state="{state}"}} {seconds:.3f}')
+    for cause, count in snapshot['retransmits'].items():
+        lines.append(f'{prefix}retransmits_total{{cause="{cause}"}} {count}')
+    for name, histogram in snapshot['histograms'].items():
+        lines.append(f'# TYPE {prefix}{name} histogram')
+        for bound, count in histogram['buckets']:
+            lines.append(f'{prefix}{name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{prefix}{name}_sum {histogram["sum"]:.3f}')
+        lines.append(f'{prefix}{name}_count {histogram["count"]}')
+    for name, value in snapshot['gauges'].items():
+        lines.append(f'{prefix}{name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,101 @@
+# Token bucket pacer: spread the data segments of a window over time instead of sending
+# them back to back, either at a fixed rate or at the window over the smoothed RTT
+import time
+
+# pace the window over the RTT instead of a fixed rate
+PACE_RTT = 'rtt'
+
+# in rtt mode send a bit faster than window / srtt so the pacer is not the bottleneck
+PACING_GAIN = 1.25
+
+# max segments sent back to back when the bucket is full
+PACE_BURST = 2
+
+UNITS = {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9}
+
+
+# argparse type: 'rtt' or a bitrate like 500k, 20M, 1.5G (bits per second), return bytes per second
+def parse_rate(text):
+    text = text.strip().lower()
+    if text == PACE_RTT:
+        return PACE_RTT
+    unit = text[-1] if text[-1] in UNITS else ''
+    return float(text[:len(text) - len(unit)]) * UNITS[unit] / 8
+
+
+class Pacer:
+    def __init__(self, rate, burst) -> None:
+        '''
+        :param rate: the target rate in bytes per second, or PACE_RTT to follow window / srtt
+        :param burst: the bucket size in bytes, the most we can send back to back
+        '''
+        self.rtt_mode = rate == PACE_RTT
+        # 0 means no limit, until the first RTT sample in rtt mode
+        self.rate = 0 if self.rtt_mode else float(rate)
+        self.gain = PACING_GAIN
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        # statistics
+        self.sent_bytes = 0
+        self.first_send_time = None
+        self.last_send_time = None
+        self.queued_since = None  # when the bucket first held back the next segment
+        self.queue_delay = 0  # total time the segments waited for tokens
+        self.sent_segments = 0
+
+    # change the target rate at runtime, in bytes per second
+    def set_rate(self, rate):
+        self.rtt_mode = rate == PACE_RTT
+        self.rate = 0 if self.rtt_mode else float(rate)
+
+    # scale the rate at runtime, in rtt mode it scales the gain
+    def scale(self, factor):
+        if self.rtt_mode:
+            self.gain *= factor
+        self.rate *= factor
+
+    # in rtt mode the rate follows the window in bytes over the smoothed RTT in ms
+    def pace_rtt(self, window_bytes, srtt):
+        if self.rtt_mode and srtt:
+            self.rate = self.gain * window_bytes * 1000 / srtt
+
+    def refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    # seconds to wait before size bytes can go, 0 if they can go now
+    def delay(self, size):
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        self.refill(now)
+        if self.tokens >= min(size, self.burst):
+            return 0
+        if self.queued_since is None:
+            self.queued_since = now
+        return (min(size, self.burst) - self.tokens) / self.rate
+
+    def consume(self, size):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens -= size
+        if self.queued_since is not None:
+            self.queue_delay += now - self.queued_since
+            self.queued_since = None
+        if self.first_send_time is None:
+            self.first_send_time = now
+        self.last_send_time = now
+        self.sent_bytes += size
+        self.sent_segments += 1
+
+    # the rate we actually sent at, in bytes per second
+    def get_achieved_rate(self):
+        if self.first_send_time is None or self.last_send_time == self.first_send_time:
+            return 0
+        return self.sent_bytes / (self.last_send_time - self.first_send_time)
+
+    # the average time a segment waited for tokens, in ms
+    def get_queue_delay(self):
+        return self.queue_delay * 1000 / self.sent_segments if self.sent_segments else 0
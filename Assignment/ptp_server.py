@@ -0,0 +1,235 @@
+"""
+    Multi-session PTP receiver
+    Python 3
+    Usage: python3 ptp_server.py receiver_port FileReceived_{host}_{port}.txt flp rlp [--sack K] [--idle-timeout SECONDS]
+                                 [--sessions N] [--stats-interval SECONDS] [--flush-size BYTES] [--header-version 3]
+                                 [--recv-win BYTES] [--mss BYTES] [--ack-every N] [--ack-delay MS]
+                                 [--log text|off]
+    coding: utf-8
+
+    Notes:
+        One socket for every sender: the segments are demultiplexed by their source address, each
+        address has its own session (a Receiver) and its own output file, named from the template
+        with {host}, {port} and {n} (the session number). Run the senders as usual:
+            python3 ptp_server.py 9000 FileReceived_{port}.txt 0 0
+            python3 sender.py 11000 9000 FileToSend.txt 5000 100
+            python3 sender.py 11001 9000 FileToSend.txt 5000 100
+        A finished session stays in TIME_WAIT to ack a retransmitted FIN, every session idle for
+        idle_timeout seconds is evicted (an unfinished one keeps what was received).
+"""
+import asyncio
+import logging  # to write the log
+import argparse  # for the optional arguments
+import socket
+import time
+from header_type import Htype, HEADER_V3, HEADER_VERSIONS, MAX_MSS, get_header_type, get_header_size, parse_header
+from header_type import verify_checksum, verify_options_checksum
+from receiver import Receiver, FLUSH_SIZE, RECV_WIN, ACK_DELAY, LISTEN, TIME_WAIT
+from async_ptp import TransportSocket, LoopDelayedAck
+from event_log import setup_log, LOG_TEXT, LOG_OFF
+
+# seconds without a segment before a session is evicted
+IDLE_TIMEOUT = 30
+
+# seconds between two aggregate stats reports, 0 only report at exit
+STATS_INTERVAL = 10
+
+
+class PeerLogger(logging.LoggerAdapter):
+    # prefix every log line of a session with its sender address
+    def process(self, msg, kwargs):
+        return f'{self.extra["peer"]}\t{msg}', kwargs
+
+
+class Session(LoopDelayedAck, Receiver):
+    def __init__(self, server, sender_address, filename, flp, rlp, **options) -> None:
+        '''
+        The Receiver state of one sender, the segments come from the socket of the server.
+        :param server: the ReceiverServer which owns the socket
+        :param sender_address: the (host, port) the segments of this session come from
+        '''
+        self.server = server
+        self.sender_address = sender_address
+        super().__init__(server.receiver_port, sender_address[1], filename, flp, rlp, **options)
+        self.logger = PeerLogger(logging.getLogger(), {'peer': f'{sender_address[0]}:{sender_address[1]}'})
+        self.state = LISTEN
+        self.last_seen = time.monotonic()
+
+    # the server owns the socket
+    def open_transport(self):
+        self.batch_socket = self.server.batch_socket
+
+    def handle_segment(self, incoming_message, sender_address):
+        self.last_seen = time.monotonic()
+        if self.state != TIME_WAIT:
+            return super().handle_segment(incoming_message, sender_address)
+        # our fin ack was lost, ack the fin again
+        if get_header_type(incoming_message) == Htype.FIN and len(incoming_message) >= get_header_size(self.header_version) \
+                and verify_checksum(incoming_message, self.header_version):
+            header_type, seqno, payload = parse_header(incoming_message, self.header_version)
+            self.write_log('rcv', Htype.FIN, seqno, 0)
+            self.send_ack((seqno + 1) % self.seq_space, sender_address)
+        return False
+
+
+class ReceiverServer(asyncio.DatagramProtocol):
+    def __init__(self, receiver_port: int, output: str, flp: float, rlp: float, idle_timeout: float = IDLE_TIMEOUT,
+                 sessions: int = 0, stats_interval: float = STATS_INTERVAL, **options) -> None:
+        '''
+        Receive files from many senders on one UDP port
+        :param receiver_port: the UDP port number on which every sender sends its PTP segments.
+        :param output: the output file name template, with {host}, {port} and {n}.
+        :param flp: forward loss probability of every session.
+        :param rlp: reverse loss probability of every session.
+        :param idle_timeout: seconds without a segment before a session is evicted.
+        :param sessions: stop once this many sessions are over, 0 keep running.
+        :param stats_interval: seconds between two aggregate stats reports, 0 only report at exit.
+        :param options: the other Receiver options (sack, flush_size, header_version, recv_win, mss, ack_every,
+                        ack_delay) of every session.
+        '''
+        self.receiver_port = int(receiver_port)
+        self.server_address = ("127.0.0.1", self.receiver_port)
+        self.output = output
+        self.flp = float(flp)
+        self.rlp = float(rlp)
+        self.idle_timeout = float(idle_timeout)
+        self.max_sessions = int(sessions)
+        self.stats_interval = float(stats_interval)
+        self.options = options
+        # the session table keyed by the sender address
+        self.sessions = {}  # type: dict[tuple[str, int], Session]
+        self.n = 0  # Number of sessions opened
+        self.completed = 0  # Number of sessions closed by FIN
+        self.resets = 0  # Number of sessions closed by RESET
+        self.evicted = 0  # Number of sessions evicted before their FIN
+        self.closed_rdb = 0  # Amount of data received by the sessions no longer in the table
+        self.start_time = None
+        self.transport = None
+        self.batch_socket = None
+        self.timers = []
+        self.done = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.batch_socket = TransportSocket(transport)
+
+    def error_received(self, exc):
+        pass
+
+    def datagram_received(self, data, addr):
+        session = self.sessions.get(addr)
+        # a syn from a new address, or from a finished one which reuse its port, opens a session,
+        # a syn with corrupted options does not replace a finished one
+        if get_header_type(data) == Htype.SYN and (session is None or session.state == TIME_WAIT) \
+                and verify_options_checksum(data):
+            if session is not None:
+                self.remove_session(addr)
+            session = self.open_session(addr)
+        if session is None:
+            return
+        if session.handle_segment(data, addr):
+            # a file which does not match the digest of the sender is reset too
+            if get_header_type(data) == Htype.RESET or session.verified is False:
+                self.resets += 1
+                self.remove_session(addr)
+            else:
+                self.completed += 1
+                session.state = TIME_WAIT
+            if self.max_sessions and self.completed + self.resets + self.evicted >= self.max_sessions:
+                if not self.done.done():
+                    self.done.set_result(None)
+
+    def open_session(self, sender_address):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        self.n += 1
+        filename = self.output.format(host=sender_address[0], port=sender_address[1], n=self.n)
+        session = Session(self, sender_address, filename, self.flp, self.rlp, **self.options)
+        self.sessions[sender_address] = session
+        return session
+
+    def remove_session(self, sender_address):
+        session = self.sessions.pop(sender_address)
+        self.closed_rdb += session.rdb
+
+    def evict_idle_sessions(self):
+        now = time.monotonic()
+        for sender_address, session in list(self.sessions.items()):
+            if now - session.last_seen < self.idle_timeout:
+                continue
+            if session.state != TIME_WAIT:
+                session.logger.info(f'evicted after {self.idle_timeout:g} s idle')
+                self.evicted += 1
+                session.save_file()
+            self.remove_session(sender_address)
+        if self.max_sessions and self.completed + self.resets + self.evicted >= self.max_sessions:
+            if not self.done.done():
+                self.done.set_result(None)
+        self.timers.append(self.loop.call_later(self.idle_timeout / 2, self.evict_idle_sessions))
+
+    def report(self):
+        elapsed = time.monotonic() - self.start_time if self.start_time is not None else 0
+        rdb = self.closed_rdb + sum(session.rdb for session in self.sessions.values())
+        throughput = rdb / elapsed / 1e6 if elapsed > 0 else 0
+        active = sum(1 for session in self.sessions.values() if session.state != TIME_WAIT)
+        logging.info(f'Number of Sessions {self.n} (active {active}, completed {self.completed}, '
+                     f'reset {self.resets}, evicted {self.evicted})')
+        logging.info(f'Amount of (original) Data Received {rdb}')
+        logging.info(f'Throughput (MB/s) {throughput:.2f}')
+
+    def report_periodically(self):
+        self.report()
+        self.timers.append(self.loop.call_later(self.stats_interval, self.report_periodically))
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.done = self.loop.create_future()
+        await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.server_address)
+        # every session shares the kernel buffer of the socket
+        sock = self.transport.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.options.get('recv_win', RECV_WIN))
+        self.timers.append(self.loop.call_later(self.idle_timeout / 2, self.evict_idle_sessions))
+        if self.stats_interval > 0:
+            self.timers.append(self.loop.call_later(self.stats_interval, self.report_periodically))
+        try:
+            await self.done
+        finally:
+            for timer in self.timers:
+                timer.cancel()
+            # keep what the unfinished sessions have received
+            for session in self.sessions.values():
+                if session.state != TIME_WAIT:
+                    session.save_file()
+            self.transport.close()
+            self.report()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('receiver_port', type=int)
+    parser.add_argument('output', help='output file name template, with {host}, {port} and {n}')
+    parser.add_argument('flp', type=float)
+    parser.add_argument('rlp', type=float)
+    parser.add_argument('--sack', type=int, default=0, help='max SACK blocks per ACK, 0 to disable')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT, help='seconds before an idle session is evicted')
+    parser.add_argument('--sessions', type=int, default=0, help='stop once this many sessions are over, 0 keep running')
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL,
+                        help='seconds between two aggregate stats reports, 0 only report at exit')
+    parser.add_argument('--flush-size', type=int, default=FLUSH_SIZE, help='bytes buffered before writing to the file')
+    parser.add_argument('--header-version', type=int, choices=HEADER_VERSIONS, default=HEADER_V3,
+                        help='highest header version accepted, 1 keeps the 16 bits seqnos, 3 adds the checksums')
+    parser.add_argument('--recv-win', type=int, default=RECV_WIN, help='receive window advertised in the syn ack')
+    parser.add_argument('--mss', type=int, default=MAX_MSS, help='largest segment size accepted')
+    parser.add_argument('--ack-every', type=int, default=0,
+                        help='one cumulative ack every N in order segments, 0 to ack each segment')
+    parser.add_argument('--ack-delay', type=float, default=ACK_DELAY, help='max ms before a delayed ack is sent')
+    # the lines of every session carry their sender address, so there is no binary log here
+    parser.add_argument('--log', choices=[LOG_TEXT, LOG_OFF], default=LOG_TEXT, help='text log or no log')
+    args = vars(parser.parse_args())
+
+    setup_log("Receiver_log.txt", args.pop('log'))
+    server = ReceiverServer(**args)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        pass
@@ -1,230 +1,625 @@
-"""
-    Sample code for Receiver
-    Python 3
-    Usage: python3 receiver.py receiver_port sender_port FileReceived.txt flp rlp
-    coding: utf-8
-
-    Notes:
-        Try to run the server first with the command:
-            python3 receiver.py 9000 10000 FileReceived.txt 1 1
-        Then run the sender:
-            python3 sender.py 11000 9000 FileToReceived.txt 1000 1
-
-    Author: Rui Li (Tutor for COMP3331/9331)
-"""
-# here are the libs you may find it useful:
-import datetime, time  # to calculate the time delta of packet transmission
-import logging, sys  # to write the log
-import socket  # Core lib, to send packet via UDP socket
-from threading import Thread  # (Optional)threading will make the timer easily implemented
-import random  # for flp and rlp function
-from header_type import Htype, get_type  # a class contain all segment header type
-
-BUFFERSIZE = 16 * 1024
-
-CLOSED = 0
-LISTEN = 1
-ESTABLISHED = 2
-TIME_WAIT = 3
-
-
-class Receiver:
-    def __init__(self, receiver_port: int, sender_port: int, filename: str, flp: float, rlp: float) -> None:
-        '''
-        The server will be able to receive the file from the sender via UDP
-        :param receiver_port: the UDP port number to be used by the receiver to receive PTP segments from the sender.
-        :param sender_port: the UDP port number to be used by the sender to send PTP segments to the receiver.
-        :param filename: the name of the text file into which the text sent by the sender should be stored
-        :param flp: forward loss probability, which is the probability that any segment in the forward direction (Data, FIN, SYN) is lost.
-        :param rlp: reverse loss probability, which is the probability of a segment in the reverse direction (i.e., ACKs) being lost.
-
-        '''
-        self.address = "127.0.0.1"  # change it to 0.0.0.0 or public ipv4 address if want to test it between different computers
-        self.receiver_port = int(receiver_port)
-        self.sender_port = int(sender_port)
-        self.server_address = (self.address, self.receiver_port)
-
-        self.filename = filename
-        self.flp = float(flp)
-        self.rlp = float(rlp)
-        # at start the receiver is in closed state
-        self.state = CLOSED
-        self.seqs_saved = []
-        # init the UDP socket
-        # define socket for the server side and bind address
-
-        self.receiver_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
-        self.receiver_socket.bind(self.server_address)
-        self.received_windows = []
-        self.start_window_seq = 0
-        self.orderd_data = []
-        # create a receiver side log file
-        self.start_time = -1
-        self.seqno = 0
-        self.org_seqno = 0
-        self.rdb = 0  # Amount of (original) Data Received
-        self.rds = 0  # Number of (original) Data Segments Received
-        self.rdds = 0  # Number of duplicate Data segments received
-        self.dds = 0  # Number of Data segments dropped
-        self.das = 0  # Number of ACK segments dropped
-        self.fined=False
-        pass
-
-    def get_position_in_window(self, seqno):
-        if seqno >= self.start_window_seq:
-            return (seqno - self.start_window_seq) // 1000
-        else:
-            return (seqno + 2 ** 16 - self.start_window_seq) // 1000
-
-    def run(self) -> None:
-        '''
-        This function contain the main logic of the receiver
-        '''
-        # create the receive file
-        with open(self.filename, 'w') as f:
-            pass
-        self.state = LISTEN
-        while True:
-
-            try:
-                incoming_message, sender_address = self.receiver_socket.recvfrom(BUFFERSIZE)
-                seqno = int.from_bytes(incoming_message[2:4], byteorder='big')
-                header_type = int.from_bytes(incoming_message[0:2], byteorder='big')
-                # randomly drop the packet we received 
-                if random.random() < self.flp and header_type != Htype.RESET:
-                    self.write_log('drp', header_type, seqno, len(incoming_message[4:]))
-                    if header_type == Htype.DATA:
-                        self.dds += 1
-                    continue
-                # if we receive the syn segment
-                if header_type == Htype.SYN:
-                    seqno_for_ack = (seqno + 1) % (2 ** 16)
-                    if self.state == LISTEN:
-                        self.state = ESTABLISHED
-                        self.write_log('rcv', header_type, seqno, 0)
-                        self.start_time = datetime.datetime.timestamp(datetime.datetime.now())
-                        self.start_window_seq = seqno_for_ack
-                        # random drop the segemnt
-                        if random.random() < self.rlp:
-                            self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
-                            self.das += 1
-                        else:
-                            # if we receive the segemnt
-                            self.write_log('snd', Htype.ACK, seqno_for_ack, 0)
-                            headers = Htype.ACK.to_bytes(2, 'big') + seqno_for_ack.to_bytes(2, 'big')
-                            self.receiver_socket.sendto(headers, sender_address)
-                    else:
-                        # prevent if we receive duplicate syn segment
-                        self.write_log('rcv', header_type, seqno, 0)
-                        if random.random() < self.rlp:
-                            self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
-                            self.das += 1
-                        else:
-                            self.write_log('snd', Htype.ACK, seqno_for_ack, 0)
-                            headers = Htype.ACK.to_bytes(2, 'big') + seqno_for_ack.to_bytes(2, 'big')
-                            self.receiver_socket.sendto(headers, sender_address)
-
-                # if we receive the data segment
-                elif header_type == Htype.DATA:
-                    data = incoming_message[4:]
-                    seqno_for_ack = (seqno + len(data)) % 2 ** 16
-                    self.write_log("rcv", header_type, seqno, len(data))
-                    self.rds += 1
-                    # if we receive the duplicate data segment 
-                    if seqno in self.seqs_saved:
-                        self.rdds += 1
-                        if random.random() < self.rlp:
-                            self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
-                            self.das += 1
-                        else:
-                            self.write_log('snd', Htype.ACK, seqno_for_ack, 0)
-                            headers = Htype.ACK.to_bytes(2, 'big') + seqno_for_ack.to_bytes(2, 'big')
-                            self.receiver_socket.sendto(headers, sender_address)
-                    else:
-                        # if the data segemnt is new 
-                        self.rdb += len(data)
-                        index = self.get_position_in_window(seqno)
-                        if len(self.received_windows) <= index:
-                            # update the window size 
-                            self.received_windows.extend([None for _ in range(index + 1 - len(self.received_windows))])
-                        self.received_windows[index] = data
-                        # initialize window and ready to manage data segment
-                        if index == 0:
-                            while True:
-                                if len(self.received_windows) == 0:
-                                    break
-                                if self.received_windows[0] is None:
-                                    break
-                                data = self.received_windows[0]
-                                self.seqs_saved.append(self.start_window_seq)
-                                self.orderd_data.append(data)
-                                self.start_window_seq = (self.start_window_seq + len(data)) % 2 ** 16
-                                del self.received_windows[0]
-                        if random.random() < self.rlp:
-                            self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
-                            self.das += 1
-                        else:
-                            self.write_log('snd', Htype.ACK, seqno_for_ack, 0)
-                            headers = Htype.ACK.to_bytes(2, 'big') + seqno_for_ack.to_bytes(2, 'big')
-                            self.receiver_socket.sendto(headers, sender_address)
-                
-                # if we receive fin segement
-                elif header_type == Htype.FIN:
-                    self.write_log("rcv", Htype.FIN, seqno, 0)
-                    seqno_for_ack = (seqno + 1) % 2 ** 16
-
-                    if random.random() < self.rlp:
-                        self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
-                        self.das += 1
-                    else:
-                        self.write_log('snd', Htype.ACK,seqno_for_ack, 0)
-                        headers = Htype.ACK.to_bytes(2, 'big') + seqno_for_ack.to_bytes(2, 'big')
-                        self.receiver_socket.sendto(headers, sender_address)
-                        logging.info(f'Amount of (original) Data Received {self.rdb}')
-                        logging.info(f'Number of (original) Data Segments Received {self.rds}')
-                        logging.info(f'Number of duplicate Data segments received {self.rdds}')
-                        logging.info(f'Number of Data segments dropped {self.dds}')
-                        logging.info(f'Number of ACK segments dropped {self.das}')
-                        self.save_file()
-                        return
-
-                elif header_type == Htype.RESET:
-                    self.write_log("rcv", Htype.RESET, seqno, 0)
-                    print('a closure of the connection due to a RESET packet')
-                    return
-
-            except ConnectionResetError:
-                print(1)
-                break
-
-    def save_file(self):
-        with open(self.filename, 'wb') as f:
-            for data in self.orderd_data:
-                f.write(data)
-
-    def write_log(self, action, packet_type, seqno, size):
-        packet_type = get_type(packet_type)
-
-        if packet_type == "SYN" and action == 'rcv' and self.start_time == -1:
-            self.start_time = datetime.datetime.timestamp(datetime.datetime.now())
-        current_time = datetime.datetime.timestamp(datetime.datetime.now())
-        interval = (current_time - self.start_time) * 1000 if self.start_time!=-1 else 0
-        log = '{:<8}\t{:<10.2f}\t{:<8}\t{:<8}\t{:<8}'.format(action, interval, packet_type, str(seqno), str(size))
-        logging.info(log)
-
-
-if __name__ == '__main__':
-    # logging is useful for the log part: https://docs.python.org/3/library/logging.html
-    logging.basicConfig(
-        filename="Receiver_log.txt",
-        level=logging.INFO,
-        format='',
-        filemode='w')
-
-    if len(sys.argv) != 6:
-        print(
-            "\n===== Error usage, python3 receiver.py receiver_port sender_port FileReceived.txt flp rlp ======\n")
-        exit(0)
-
-    receiver = Receiver(*sys.argv[1:])
-    receiver.run()
+"""
+    Sample code for Receiver
+    Python 3
+    Usage: python3 receiver.py receiver_port sender_port FileReceived.txt flp rlp [--sack K] [--flush-size BYTES]
+                                                                                [--header-version 3] [--recv-win BYTES]
+                                                                                [--mss BYTES] [--ack-every N]
+                                                                                [--ack-delay MS] [--log text|binary|off]
+                                                                                [--metrics FILE.json|FILE.prom]
+                                                                                [--metrics-interval SECONDS]
+    coding: utf-8
+
+    Notes:
+        Try to run the server first with the command:
+            python3 receiver.py 9000 10000 FileReceived.txt 1 1
+        Then run the sender:
+            python3 sender.py 11000 9000 FileToReceived.txt 1000 1
+
+    Author: Rui Li (Tutor for COMP3331/9331)
+"""
+# here are the libs you may find it useful:
+import datetime, time  # to calculate the time delta of packet transmission
+import os
+import logging, sys  # to write the log
+import argparse  # for the optional arguments
+import socket  # Core lib, to send packet via UDP socket
+from threading import Thread  # (Optional)threading will make the timer easily implemented
+import random  # for flp and rlp function
+from collections import deque
+from batch_io import BatchSocket  # drain every queued segment per wakeup
+from header_type import Htype, get_type, pack_sack  # a class contain all segment header type
+from header_type import HEADER_V1, HEADER_V2, HEADER_V3, HEADER_VERSIONS, get_seq_space, make_header, parse_header
+from header_type import get_header_size, get_message_version, verify_checksum, has_checksum, new_digest
+from header_type import unpack_syn_options, pack_syn_ack_options, DEFAULT_MSS, MAX_MSS
+from header_type import ACK_CUMULATIVE, add_options_checksum, verify_options_checksum
+from event_log import setup_log, LOG_LEVELS, LOG_TEXT  # text, binary or no packet log
+from metrics import Metrics, METRICS_INTERVAL, REORDER_BUCKETS  # live metrics of the transfer
+
+# the smallest receive buffer, it grows to fit the largest mss we accept
+BUFFERSIZE = 16 * 1024
+
+# write the in order data to the file once this many bytes are pending
+FLUSH_SIZE = 64 * 1024
+
+# max buffers in one writev call, the kernel refuses more with EINVAL
+IOV_MAX = os.sysconf('SC_IOV_MAX') if hasattr(os, 'sysconf') else 1024
+
+# receive window advertised in the syn ack, scaled to fit the 16 bits window field
+RECV_WIN = 4 * 1024 * 1024
+
+# max time in ms an in order segment waits for its cumulative ack
+ACK_DELAY = 10
+
+CLOSED = 0
+LISTEN = 1
+ESTABLISHED = 2
+TIME_WAIT = 3
+STATE_NAMES = {CLOSED: 'CLOSED', LISTEN: 'LISTEN', ESTABLISHED: 'ESTABLISHED', TIME_WAIT: 'TIME_WAIT'}
+
+
+class Segment_Writer:
+    def __init__(self, filename, flush_size=FLUSH_SIZE, stripe=None, digest=False):
+        '''
+        Write the in order data to the file while the window advances, the pending segments
+        are written together with one writev call once flush_size bytes are waiting.
+        :param stripe: (offset, file size) to write one stripe of a striped transfer, the file is
+                       shared by every stripe so it is preallocated instead of truncated
+        :param digest: keep the digest of the data written, to check it against the one in the fin
+        '''
+        self.flush_size = flush_size
+        self.digest = new_digest() if digest else None
+        self.pending = []
+        self.pending_size = 0
+        self.position = None
+        if stripe is None:
+            self.fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        else:
+            self.position, file_size = stripe
+            self.fd = os.open(filename, os.O_WRONLY | os.O_CREAT, 0o644)
+            if os.fstat(self.fd).st_size != file_size:
+                os.ftruncate(self.fd, file_size)
+
+    def write(self, data):
+        if self.digest is not None:
+            self.digest.update(data)
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.position is not None:
+            self.flush_at_position()
+        elif hasattr(os, 'writev'):
+            for start in range(0, len(self.pending), IOV_MAX):
+                buffers = self.pending[start:start + IOV_MAX]
+                written = os.writev(self.fd, buffers)
+                # writev may write less than asked, the rest go with plain write
+                if written < sum(map(len, buffers)):
+                    rest = b''.join(buffers)[written:]
+                    while rest:
+                        rest = rest[os.write(self.fd, rest):]
+        else:
+            for data in self.pending:
+                while data:
+                    data = data[os.write(self.fd, data):]
+        self.pending = []
+        self.pending_size = 0
+
+    # a stripe writes at its own offset, so the stripes never move a shared file position
+    def flush_at_position(self):
+        for start in range(0, len(self.pending), IOV_MAX):
+            buffers = self.pending[start:start + IOV_MAX]
+            if hasattr(os, 'pwritev'):
+                written = os.pwritev(self.fd, buffers, self.position)
+                rest = b''.join(buffers)[written:] if written < sum(map(len, buffers)) else b''
+            else:
+                written = 0
+                rest = b''.join(buffers)
+            self.position += written
+            while rest:
+                written = os.pwrite(self.fd, rest, self.position)
+                self.position += written
+                rest = rest[written:]
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+
+class Recent_Seqnos:
+    def __init__(self, seq_space):
+        '''
+        The seqnos of the segments delivered in the last seq_space bytes, so a retransmitted one
+        is found in O(1) however far behind the window it is.
+        :param seq_space: the seqnos are modulo seq_space, a seqno is only kept until it could come back
+        '''
+        self.seq_space = seq_space
+        self.segments = deque()  # (seqno, length) in delivery order
+        self.seqnos = set()
+        self.size = 0
+
+    def add(self, seqno, length):
+        self.segments.append((seqno, length))
+        self.seqnos.add(seqno)
+        self.size += length
+        while self.size >= self.seq_space:
+            seqno, length = self.segments.popleft()
+            self.seqnos.discard(seqno)
+            self.size -= length
+
+    def __contains__(self, seqno):
+        return seqno in self.seqnos
+
+
+class Sack_Ranges:
+    def __init__(self):
+        '''
+        The ranges of segments held out of order, merged with their neighbours as each segment
+        arrives, so an ack finds its SACK blocks without sorting the reorder buffer. As in RFC 2018
+        the first block holds the latest segment and the next ones repeat the blocks sent before.
+        '''
+        self.ends = {}  # start seqno -> end seqno of each range
+        self.starts = {}  # end seqno -> start seqno of each range
+        self.latest = None  # the start of the range of the latest segment
+        self.reported = []  # the starts of the ranges in the last blocks sent
+
+    def add(self, start, end):
+        # the segment joins the range which ends where it starts and the one which starts where it ends
+        left = self.starts.pop(start, None)
+        if left is not None:
+            del self.ends[left]
+            start = left
+        right = self.ends.pop(end, None)
+        if right is not None:
+            del self.starts[right]
+            end = right
+        self.ends[start] = end
+        self.starts[end] = start
+        self.latest = start
+
+    # the range starting at start has been delivered
+    def remove(self, start):
+        end = self.ends.pop(start, None)
+        if end is not None:
+            del self.starts[end]
+
+    # at most count (start, end) blocks, the latest range first, then the ones reported before,
+    # then any other range, every step stops once there are count of them
+    def get_blocks(self, count):
+        blocks = []
+        for starts in [[self.latest] + self.reported, self.ends]:
+            for start in starts:
+                if len(blocks) == count:
+                    break
+                if start in self.ends and (start, self.ends[start]) not in blocks:
+                    blocks.append((start, self.ends[start]))
+        self.reported = [start for start, end in blocks]
+        return blocks
+
+
+class Receiver:
+    def __init__(self, receiver_port: int, sender_port: int, filename: str, flp: float, rlp: float,
+                 sack: int = 0, flush_size: int = FLUSH_SIZE, header_version: int = HEADER_V3,
+                 recv_win: int = RECV_WIN, mss: int = MAX_MSS, ack_every: int = 0,
+                 ack_delay: float = ACK_DELAY, event_log=None, metrics_file: str = None,
+                 metrics_interval: float = METRICS_INTERVAL) -> None:
+        '''
+        The server will be able to receive the file from the sender via UDP
+        :param receiver_port: the UDP port number to be used by the receiver to receive PTP segments from the sender.
+        :param sender_port: the UDP port number to be used by the sender to send PTP segments to the receiver.
+        :param filename: the name of the text file into which the text sent by the sender should be stored
+        :param flp: forward loss probability, which is the probability that any segment in the forward direction (Data, FIN, SYN) is lost.
+        :param rlp: reverse loss probability, which is the probability of a segment in the reverse direction (i.e., ACKs) being lost.
+        :param sack: max number of SACK blocks reported in each data ACK, 0 disable the SACK extension.
+        :param flush_size: number of in order bytes buffered before they are written to the file.
+        :param header_version: the highest header version accepted from the sender's SYN.
+        :param recv_win: the receive window in bytes advertised to the sender.
+        :param mss: the largest segment size accepted from the sender's SYN.
+        :param ack_every: send one cumulative ack every ack_every in order segments, 0 ack each segment with its own seqno.
+        :param ack_delay: max time in ms an in order segment waits for its cumulative ack.
+        :param event_log: the EventLog which records the packets in binary, None to write the text log.
+        :param metrics_file: the file rewritten with the metrics during the transfer, Prometheus text if it ends
+                             with .prom, JSON otherwise, None to not write them.
+        :param metrics_interval: seconds between two writes of the metrics file.
+
+        '''
+        self.address = "127.0.0.1"  # change it to 0.0.0.0 or public ipv4 address if want to test it between different computers
+        self.receiver_port = int(receiver_port)
+        self.sender_port = int(sender_port)
+        self.server_address = (self.address, self.receiver_port)
+
+        self.filename = filename
+        self.flp = float(flp)
+        self.rlp = float(rlp)
+        self.sack = int(sack)
+        # the header version is version 1 until we accept a higher one from the syn
+        self.accepted_header_version = int(header_version)
+        self.header_version = HEADER_V1
+        self.seq_space = get_seq_space(HEADER_V1)
+        self.recv_win = int(recv_win)
+        self.max_mss = min(int(mss), MAX_MSS)
+        self.mss = DEFAULT_MSS
+        self.buffer_size = max(BUFFERSIZE, get_header_size(HEADER_V3) + self.max_mss)
+        # the options of our syn ack, empty when the sender does not negotiate
+        self.syn_ack_options = b''
+        # cumulative acks are only used with a sender which negotiates them
+        self.ack_every = int(ack_every)
+        self.ack_delay = float(ack_delay) / 1000
+        self.cumulative_ack = False
+        self.unacked_segments = 0
+        # when the delayed ack is due, None when no ack is waiting
+        self.ack_deadline = None
+        self.ack_address = None
+        self.metrics = Metrics('receiver', STATE_NAMES, CLOSED, {'reorder_segments': REORDER_BUCKETS})
+        self.metrics_file = metrics_file
+        self.metrics_interval = float(metrics_interval)
+        # when the metrics file is written again, None when there is no metrics file
+        self.metrics_deadline = None
+        # at start the receiver is in closed state
+        self._state = CLOSED
+        # out of order segments keyed by their (wrapped) seqno
+        self.received_windows = {}  # type: dict[int, bytes]
+        self.start_window_seq = 0
+        # the ranges reported in the SACK blocks
+        self.sack_ranges = Sack_Ranges()
+        # the window of a sender without syn options is not capped to half the sequence space,
+        # its duplicates are found by seqno instead, None for the other senders
+        self.recent_seqnos = None
+        self.flush_size = int(flush_size)
+        # the file is opened once the syn tells if it is the whole file or a stripe of it
+        self.writer = None
+        self.stripe = None
+        # create a receiver side log file
+        self.logger = logging.getLogger()
+        self.event_log = event_log
+        self.start_time = -1
+        self.seqno = 0
+        self.org_seqno = 0
+        self.rdb = 0  # Amount of (original) Data Received
+        self.rds = 0  # Number of (original) Data Segments Received
+        self.rdds = 0  # Number of duplicate Data segments received
+        self.dds = 0  # Number of Data segments dropped
+        self.das = 0  # Number of ACK segments dropped
+        self.cds = 0  # Number of corrupted segments dropped
+        # if the file matches the digest of the fin, None without a digest
+        self.verified = None
+        self.fined=False
+        self.open_transport()
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.metrics.set_state(state)
+
+    # init the UDP socket
+    # define socket for the server side and bind address
+    def open_transport(self):
+        self.receiver_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.receiver_socket.bind(self.server_address)
+        # let the kernel hold a whole receive window of datagrams
+        self.receiver_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_win)
+        self.batch_socket = BatchSocket(self.receiver_socket, self.buffer_size)
+
+    # byte offset of seqno from the start of the window, with the wraparound of the sequence space
+    def get_position_in_window(self, seqno):
+        return (seqno - self.start_window_seq) % self.seq_space
+
+    # a segment in the half of the sequence space behind the window has already been delivered
+    def is_delivered(self, seqno):
+        if self.recent_seqnos is not None:
+            return seqno in self.recent_seqnos
+        return self.get_position_in_window(seqno) >= self.seq_space // 2
+
+    # the ranges we hold after the first hole, as (start, end) seqnos, at most self.sack of them
+    def get_sack_blocks(self):
+        return self.sack_ranges.get_blocks(self.sack)
+
+    # send the ack unless the reverse path drops it
+    def send_ack(self, seqno_for_ack, sender_address, payload=b'', header_version=None):
+        if random.random() < self.rlp:
+            self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
+            self.das += 1
+        else:
+            self.write_log('snd', Htype.ACK, seqno_for_ack, 0)
+            headers = make_header(Htype.ACK, seqno_for_ack, header_version or self.header_version, payload)
+            self.batch_socket.send(headers, payload, sender_address)
+
+    # choose the header version from the syn options, the syn itself is always version 1
+    def negotiate(self, seqno, payload):
+        offered_version, start_seqno, mss, self.stripe = unpack_syn_options(payload)
+        if start_seqno is None:
+            # an old sender, no options in the syn ack either
+            self.start_window_seq = (seqno + 1) % self.seq_space
+            self.recent_seqnos = Recent_Seqnos(self.seq_space)
+            return
+        if offered_version >= HEADER_V2 and self.accepted_header_version >= HEADER_V2:
+            self.header_version = min(offered_version, self.accepted_header_version)
+            self.mss = min(mss, self.max_mss)
+        self.seq_space = get_seq_space(self.header_version)
+        self.start_window_seq = (start_seqno + 1) % self.seq_space
+        self.buffer_size = max(BUFFERSIZE, get_header_size(self.header_version) + self.mss)
+        self.batch_socket.resize(self.buffer_size)
+        self.cumulative_ack = self.ack_every > 0
+        flags = ACK_CUMULATIVE if self.cumulative_ack else 0
+        ack_delay = self.ack_delay * 1000 if self.cumulative_ack else 0
+        options = pack_syn_ack_options(self.header_version, self.recv_win, self.mss, flags, ack_delay)
+        self.syn_ack_options = add_options_checksum(make_header(Htype.ACK, (seqno + 1) % 2 ** 16), options)
+
+    # ack a data segment, a cumulative ack for an in order segment may wait for the next ones
+    def ack_data(self, seqno_for_ack, sender_address, delayable):
+        if not self.cumulative_ack:
+            self.send_ack(seqno_for_ack, sender_address, self.get_sack_payload())
+            return
+        self.unacked_segments += 1
+        # a gap, a duplicate or a filled gap is acked at once so the sender sees it
+        if not delayable or self.unacked_segments >= self.ack_every:
+            self.send_cumulative_ack(sender_address)
+        else:
+            self.delay_ack(sender_address)
+
+    def send_cumulative_ack(self, sender_address):
+        self.cancel_delayed_ack()
+        self.unacked_segments = 0
+        self.send_ack(self.start_window_seq, sender_address, self.get_sack_payload())
+
+    # the run loop wakes up at the deadline to send the ack
+    def delay_ack(self, sender_address):
+        if self.ack_deadline is None:
+            self.ack_deadline = time.monotonic() + self.ack_delay
+            self.ack_address = sender_address
+
+    def cancel_delayed_ack(self):
+        self.ack_deadline = None
+
+    def send_delayed_ack(self):
+        if self.ack_deadline is not None:
+            self.send_cumulative_ack(self.ack_address)
+
+    def get_sack_payload(self):
+        if self.sack == 0:
+            return b''
+        return pack_sack(self.start_window_seq, self.get_sack_blocks(), self.header_version)
+
+    def run(self) -> None:
+        '''
+        This function contain the main logic of the receiver
+        '''
+        self.state = LISTEN
+        if self.metrics_file is not None:
+            self.metrics_deadline = time.monotonic()
+        while True:
+            # wait for the next segment until the delayed ack or the metrics are due
+            deadlines = [deadline for deadline in [self.ack_deadline, self.metrics_deadline] if deadline is not None]
+            timeout = None
+            if deadlines:
+                timeout = min(deadlines) - time.monotonic()
+                if timeout <= 0:
+                    self.handle_deadlines()
+                    continue
+            if self.receiver_socket.gettimeout() != timeout:
+                self.receiver_socket.settimeout(timeout)
+            try:
+                batch = self.batch_socket.recv_batch()
+            except socket.timeout:
+                self.handle_deadlines()
+                continue
+            except ConnectionResetError:
+                print(1)
+                self.save_file()
+                break
+            for incoming_message, sender_address in batch:
+                if self.handle_segment(incoming_message, sender_address):
+                    return
+
+    # send the delayed ack and write the metrics once they are due
+    def handle_deadlines(self):
+        now = time.monotonic()
+        if self.ack_deadline is not None and now >= self.ack_deadline:
+            self.send_delayed_ack()
+        if self.metrics_deadline is not None and now >= self.metrics_deadline:
+            self.export_metrics()
+            self.metrics_deadline = now + self.metrics_interval
+
+    def export_metrics(self):
+        self.metrics.write(self.metrics_file, self.get_gauges())
+
+    # the current values written with the metrics
+    def get_gauges(self):
+        return {
+            'data_received_bytes': self.rdb,
+            'data_segments_received': self.rds,
+            'duplicate_segments_received': self.rdds,
+            'data_segments_dropped': self.dds,
+            'ack_segments_dropped': self.das,
+            'corrupted_segments_dropped': self.cds,
+            'reorder_buffer_segments': len(self.received_windows),
+        }
+
+    # handle one segment from the sender, return True once the connection is closed
+    def handle_segment(self, incoming_message, sender_address):
+        # the syn and the first reset always use the version 1 header
+        header_version = get_message_version(incoming_message, self.header_version)
+        if len(incoming_message) < get_header_size(header_version):
+            return False
+        header_type, seqno, payload = parse_header(incoming_message, header_version)
+        # the sender retransmits the corrupted segment as if it had been lost
+        if not verify_checksum(incoming_message, header_version) \
+                or (header_type == Htype.SYN and not verify_options_checksum(incoming_message)):
+            self.write_log('drp', Htype.CORRUPT, seqno, len(payload))
+            self.cds += 1
+            return False
+        # randomly drop the packet we received 
+        if random.random() < self.flp and header_type != Htype.RESET:
+            self.write_log('drp', header_type, seqno, len(payload))
+            if header_type == Htype.DATA:
+                self.dds += 1
+            return False
+        # if we receive the syn segment
+        if header_type == Htype.SYN:
+            seqno_for_ack = (seqno + 1) % (2 ** 16)
+            if self.state == LISTEN:
+                self.state = ESTABLISHED
+                self.write_log('rcv', header_type, seqno, 0)
+                self.start_time = datetime.datetime.timestamp(datetime.datetime.now())
+                self.negotiate(seqno, payload)
+                # create the receive file
+                self.writer = Segment_Writer(self.filename, self.flush_size, self.stripe,
+                                             has_checksum(self.header_version))
+                self.send_ack(seqno_for_ack, sender_address, self.syn_ack_options, HEADER_V1)
+            else:
+                # prevent if we receive duplicate syn segment
+                self.write_log('rcv', header_type, seqno, 0)
+                self.send_ack(seqno_for_ack, sender_address, self.syn_ack_options, HEADER_V1)
+
+        # if we receive the data segment
+        elif header_type == Htype.DATA and self.writer is not None:
+            data = payload
+            seqno_for_ack = (seqno + len(data)) % self.seq_space
+            self.write_log("rcv", header_type, seqno, len(data))
+            self.rds += 1
+            # if we receive the duplicate data segment 
+            if self.is_delivered(seqno) or seqno in self.received_windows:
+                self.rdds += 1
+                self.ack_data(seqno_for_ack, sender_address, False)
+            else:
+                # if the data segemnt is new 
+                in_order = seqno == self.start_window_seq and not self.received_windows
+                self.rdb += len(data)
+                # the batch buffers are reused, keep our own copy
+                self.received_windows[seqno] = bytes(data)
+                if self.sack:
+                    # a segment which fills the hole delivers the range after it, the others join a range
+                    if seqno == self.start_window_seq:
+                        self.sack_ranges.remove(seqno_for_ack)
+                    else:
+                        self.sack_ranges.add(seqno, seqno_for_ack)
+                # deliver every segment which is in order now
+                while self.start_window_seq in self.received_windows:
+                    data = self.received_windows.pop(self.start_window_seq)
+                    if self.recent_seqnos is not None:
+                        self.recent_seqnos.add(self.start_window_seq, len(data))
+                    self.writer.write(data)
+                    self.metrics.deliver(len(data))
+                    self.start_window_seq = (self.start_window_seq + len(data)) % self.seq_space
+                self.metrics.observe('reorder_segments', len(self.received_windows))
+                self.ack_data(seqno_for_ack, sender_address, in_order)
+        
+        # if we receive fin segement
+        elif header_type == Htype.FIN:
+            self.write_log("rcv", Htype.FIN, seqno, 0)
+            seqno_for_ack = (seqno + 1) % self.seq_space
+
+            # the fin comes once every data segment has been acked, so the whole file has been written
+            if self.writer is not None and self.writer.digest is not None and len(payload) > 0:
+                self.verified = self.writer.digest.digest() == bytes(payload)
+                if not self.verified:
+                    print('the received file does not match the digest of the sender')
+                    self.send_reset(sender_address)
+                    self.state = CLOSED
+                    self.log_stats()
+                    self.save_file()
+                    return True
+
+            if random.random() < self.rlp:
+                self.write_log('drp', Htype.ACK, seqno_for_ack, 0)
+                self.das += 1
+            else:
+                self.write_log('snd', Htype.ACK,seqno_for_ack, 0)
+                headers = make_header(Htype.ACK, seqno_for_ack, self.header_version)
+                self.batch_socket.send(headers, b'', sender_address)
+                self.state = CLOSED
+                self.log_stats()
+                self.save_file()
+                return True
+
+        elif header_type == Htype.RESET:
+            self.write_log("rcv", Htype.RESET, seqno, 0)
+            print('a closure of the connection due to a RESET packet')
+            self.state = CLOSED
+            self.save_file()
+            return True
+        return False
+
+    # tell the sender the transfer has failed, the reset is never dropped
+    def send_reset(self, sender_address):
+        self.write_log('snd', Htype.RESET, 0, 0)
+        self.batch_socket.send(make_header(Htype.RESET, 0, self.header_version), b'', sender_address)
+
+    def log_stats(self):
+        self.logger.info(f'Amount of (original) Data Received {self.rdb}')
+        self.logger.info(f'Number of (original) Data Segments Received {self.rds}')
+        self.logger.info(f'Number of duplicate Data segments received {self.rdds}')
+        self.logger.info(f'Number of Data segments dropped {self.dds}')
+        self.logger.info(f'Number of ACK segments dropped {self.das}')
+        if has_checksum(self.header_version):
+            self.logger.info(f'Number of corrupted segments dropped {self.cds}')
+            self.logger.info(f'File Digest {"verified" if self.verified else "mismatch"}')
+
+    # only the data still pending is left to write
+    def save_file(self):
+        self.cancel_delayed_ack()
+        if self.writer is not None:
+            self.writer.close()
+        # the last metrics of the transfer
+        if self.metrics_file is not None:
+            self.metrics_deadline = None
+            self.export_metrics()
+
+    def write_log(self, action, packet_type, seqno, size):
+        if self.event_log is not None:
+            if packet_type == Htype.SYN and action == 'rcv' and not self.event_log.started:
+                self.event_log.mark_start()
+            self.event_log.log(action, packet_type, seqno, size)
+            return
+        # nothing to format when the log is off
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        packet_type = get_type(packet_type)
+
+        current_time = time.time()
+        if packet_type == "SYN" and action == 'rcv' and self.start_time == -1:
+            self.start_time = current_time
+        interval = (current_time - self.start_time) * 1000 if self.start_time!=-1 else 0
+        log = '{:<8}\t{:<10.2f}\t{:<8}\t{:<8}\t{:<8}'.format(action, interval, packet_type, str(seqno), str(size))
+        self.logger.info(log)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 6:
+        print(
+            "\n===== Error usage, python3 receiver.py receiver_port sender_port FileReceived.txt flp rlp [--sack K] [--header-version 3] ======\n")
+        exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('receiver_port', type=int)
+    parser.add_argument('sender_port', type=int)
+    parser.add_argument('filename')
+    parser.add_argument('flp', type=float)
+    parser.add_argument('rlp', type=float)
+    parser.add_argument('--sack', type=int, default=0, help='max SACK blocks per ACK, 0 to disable')
+    parser.add_argument('--flush-size', type=int, default=FLUSH_SIZE, help='bytes buffered before writing to the file')
+    parser.add_argument('--header-version', type=int, choices=HEADER_VERSIONS, default=HEADER_V3,
+                        help='highest header version accepted, 1 keeps the 16 bits seqnos, 3 adds the checksums')
+    parser.add_argument('--recv-win', type=int, default=RECV_WIN, help='receive window advertised in the syn ack')
+    parser.add_argument('--mss', type=int, default=MAX_MSS, help='largest segment size accepted')
+    parser.add_argument('--ack-every', type=int, default=0,
+                        help='one cumulative ack every N in order segments, 0 to ack each segment')
+    parser.add_argument('--ack-delay', type=float, default=ACK_DELAY, help='max ms before a delayed ack is sent')
+    parser.add_argument('--log', choices=LOG_LEVELS, default=LOG_TEXT,
+                        help='text log, binary log (Receiver_log.bin, see event_log.py) or no log')
+    parser.add_argument('--metrics', dest='metrics_file', default=None,
+                        help='file rewritten with the metrics during the transfer, Prometheus text if it ends with .prom')
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                        help='seconds between two writes of the metrics file')
+    args = vars(parser.parse_args())
+
+    event_log = setup_log("Receiver_log.txt", args.pop('log'))
+    receiver = Receiver(**args, event_log=event_log)
+    receiver.run()
+    if event_log is not None:
+        event_log.close()
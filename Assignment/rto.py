@@ -0,0 +1,48 @@
+# Adaptive retransmission timeout (RFC 6298), every value is in milliseconds like rot
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+# clamps for the computed timeout
+MIN_RTO = 10
+MAX_RTO = 60000
+
+
+class RtoEstimator:
+    def __init__(self, initial_rto, min_rto=MIN_RTO, max_rto=MAX_RTO) -> None:
+        '''
+        :param initial_rto: the timeout used before the first RTT sample, the rot given on the command line
+        :param min_rto: lower bound of the timeout
+        :param max_rto: upper bound of the timeout, also caps the exponential backoff
+        '''
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = self.clamp(initial_rto)
+        self.samples = 0
+
+    def clamp(self, rto):
+        return min(max(rto, self.min_rto), self.max_rto)
+
+    # feed a RTT measured on a segment that was sent only once (Karn's algorithm)
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        # a fresh sample also cancels any previous backoff
+        self.rto = self.clamp(self.srtt + K * self.rttvar)
+        self.samples += 1
+
+    # double the timeout after a retransmission timeout
+    def backoff(self):
+        self.rto = self.clamp(self.rto * 2)
+
+    # new data has been acked, drop the backoff even without a sample (the ack may cover only
+    # retransmitted segments, which Karn's algorithm does not sample)
+    def reset_backoff(self):
+        if self.srtt is not None:
+            self.rto = self.clamp(self.srtt + K * self.rttvar)
@@ -1,362 +1,773 @@
-"""
-    Sample code for Sender (multi-threading)
-    Python 3
-    Usage: python3 sender.py receiver_port sender_port FileToSend.txt max_recv_win rto
-    coding: utf-8
-
-    Notes:
-        Try to run the server first with the command:
-            python3 receiver.py 9000 10000 FileReceived.txt 1 1
-        Then run the sender:
-            python3 sender.py 11000 9000 FileToReceived.txt 1000 1
-
-    Author: Rui Li (Tutor for COMP3331/9331)
-"""
-# here are the libs you may find it useful:
-import datetime, time
-import threading
-import signal
-import random  # to calculate the time delta of packet transmission
-import logging, sys  # to write the log
-import socket  # Core lib, to send packet via UDP socket
-from threading import Thread  # (Optional)threading will make the timer easily implemented
-from header_type import Htype, get_type  # a class contain all segment header type
-
-
-BUFFERSIZE = 1024
-
-# max time to resend segment
-MAX_RETRY = 3
-
-CLOSED = 0
-SYN_SENT = 1
-ESTABLISHED = 2
-CLOSING = 3
-FIN_WAIT = 4
-
-
-class Data_Segment:
-    def __init__(self, index, seqno, data, expected_seqno, acked=False, last_send_time=0):
-        self.index = index
-        self.seqno = seqno
-        self.data = data
-        self.expected_seqno = expected_seqno
-        self.acked = acked
-        self.last_send_time = last_send_time
-
-
-class Sender:
-    def __init__(self, sender_port: int, receiver_port: int, filename: str, max_win: int, rot: int) -> None:
-        '''
-        The Sender will be able to connect the Receiver via UDP
-        :param sender_port: the UDP port number to be used by the sender to send PTP segments to the receiver
-        :param receiver_port: the UDP port number on which receiver is expecting to receive PTP segments from the sender
-        :param filename: the name of the text file that must be transferred from sender to receiver using your reliable transport protocol.
-        :param max_win: the maximum window size in bytes for the sender window.
-        :param rot: the value of the retransmission timer in milliseconds. This should be an unsigned integer.
-        '''
-        self.sender_port = int(sender_port)
-        self.receiver_port = int(receiver_port)
-        self.sender_address = ("127.0.0.1", self.sender_port)
-        self.receiver_address = ("127.0.0.1", self.receiver_port)
-
-        self.filename = filename
-        self.max_win = int(max_win) // 1000
-        self.rot = int(rot)
-        self.windows = []  # type: list[Data_Segment]
-        # at start the sender is in closed state
-        self.state = CLOSED
-        # get a random sequence number between 1 to 2^16 - 1 and mod 2^16
-        self.start_seqno = random.randint(1, 2 ** 16 - 1)
-        self.expected_ack_seqno_for_syn = (self.start_seqno + 1) % 2 ** 16
-
-        # init the UDP socket
-        self.sender_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
-        self.sender_socket.bind(self.sender_address)
-
-        self._is_active = True  # for the multi-threading
-
-        self.start_time = 0
-        # current segment time we observing
-        self.curr_packet_time = 0
-        # count the number of data segment we have
-        self.i = 0
-        # the send retry time
-        self.retry_times = 0
-
-        self.syn_retry = 0
-        self.fin_retry = 0
-        self.base = 0
-        # check if all packet has been acked
-        self.all_packets_acked = False
-        self.synced = False
-        self.data_acked = False
-        self.fined = False
-        self.listen_thread = Thread(target=self.listen)
-        # self.listen_thread.
-        self.listen_thread.start()
-
-        self.syn_timer = Thread(target=self.syn_timeout)
-        self.fin_timer = Thread(target=self.fin_timeout)
-
-        self.data_timer = None
-        # contain all the splited data we need send
-        self.data_segments = []
-        self.seqno_for_fin_wait = 0
-        self.expected_ack_seqno_for_fin = 0
-        self.read_input_file()
-
-        self.dss = 0  # Number of Data Segments Sent
-        self.dtb = 0  # Amount of (original) Data Transferred
-        self.rds = 0  # Number of Retransmitted Data Segments
-        self.rda = 0  # 'Number of Duplicate Acknowledgements received
-        pass
-    
-    #split the input file as suitable data segment and store it
-    def read_input_file(self):
-        with open(self.filename, 'r') as f:
-            content = f.read().encode('utf-8')
-        seqno = (self.start_seqno + 1) % 2 ** 16
-        expected_seqno = 0
-        for i in range(0, len(content), 1000):
-            data = content[i:i + 1000]
-            expected_seqno = (seqno + len(data)) % 2 ** 16
-            data_segment = Data_Segment(i, seqno, data, expected_seqno, False, 0)
-            self.data_segments.append(data_segment)
-            seqno = expected_seqno
-        self.seqno_for_fin_wait = expected_seqno
-        self.expected_ack_seqno_for_fin = (expected_seqno + 1) % 2 ** 16
-    
-    # check if syn segment already timeout
-    def syn_timeout(self):
-        while self._is_active and self.state == SYN_SENT:
-            while time.time() - self.curr_packet_time < self.rot / 1000:
-                if self.state != SYN_SENT or self.synced:
-                    return
-                continue
-            # if we still can't receive the syn ack then we will send reset segment
-            if self.synced is False:
-                if self.syn_retry >= MAX_RETRY:
-                    self._is_active = False
-                    self.state = CLOSED
-                    seqno = 0
-                    self.write_log('snd', Htype.RESET, seqno, 0)
-                    headers = Htype.RESET.to_bytes(2, 'big') + seqno.to_bytes(2, 'big')
-                    self.sender_socket.sendto(headers, self.receiver_address)
-                    return
-                else:
-                    # try to resend asain
-                    self.syn_retry += 1
-                    self.write_log('snd', Htype.SYN, self.start_seqno, 0)
-                    headers = Htype.SYN.to_bytes(2, 'big') + self.start_seqno.to_bytes(2, 'big')
-                    self.sender_socket.sendto(headers, self.receiver_address)
-                    self.curr_packet_time = time.time()
-    
-    # check if fin segment already timeout
-    def fin_timeout(self):
-        while self._is_active and self.state == FIN_WAIT:
-            while time.time() - self.curr_packet_time < self.rot / 1000:
-                if self.fined:
-                    return
-                continue
-            # if we still can't receive the fin ack then we will send reset segment
-            if not self.fined:
-                if self.fin_retry >= MAX_RETRY:
-                    self._is_active = False
-                    self.state = CLOSED
-                    seqno = 0
-                    self.write_log('snd', Htype.RESET, seqno, 0)
-                    headers = Htype.RESET.to_bytes(2, 'big') + seqno.to_bytes(2, 'big')
-                    self.sender_socket.sendto(headers, self.receiver_address)
-                    return
-                else:
-                    # try to resend asain
-                    self.fin_retry += 1
-
-                    self.write_log('snd', Htype.FIN, self.seqno_for_fin_wait, 0)
-                    headers = Htype.FIN.to_bytes(2, 'big') + self.seqno_for_fin_wait.to_bytes(2, 'big')
-                    self.sender_socket.sendto(headers, self.receiver_address)
-                    self.curr_packet_time = time.time()
-
-    def get_first_non_acked_in_windows(self):
-        for data_segment in self.windows:
-            if data_segment.acked is False:
-                return data_segment
-        return None
-    
-    # check does the oldest unack segment already timeout
-    def data_timeout(self):
-        while self._is_active and self.state in [ESTABLISHED, CLOSING]:
-
-            data_segment = self.get_first_non_acked_in_windows()
-            if data_segment is None:
-                continue
-
-            last_send_time = data_segment.last_send_time
-            sleeped_time = 0 if time.time() - last_send_time >= self.rot / 1000 else self.rot / 1000 - (time.time() - last_send_time)
-            time.sleep(sleeped_time)
-            # if we can't get that segment ack we will send the segment again
-            if data_segment.acked is False:
-                data_segment.last_send_time = time.time()
-                self.rds += 1
-                self.write_log('snd', Htype.DATA, data_segment.seqno, len(data_segment.data))
-                header = Htype.DATA.to_bytes(2, 'big') + data_segment.seqno.to_bytes(2, 'big')
-                content = header + data_segment.data
-                data_segment.last_send_time = time.time()
-                self.sender_socket.sendto(content, self.receiver_address)
-
-    def ptp_open(self):
-        self.start_time = datetime.datetime.timestamp(datetime.datetime.now())
-        self.send_syn()
-        self.syn_timer.start()
-    
-    # get the except segment from the window
-    def get_index_in_windows(self, expected_seqno):
-        for i in range(len(self.windows)):
-            if self.windows[i].expected_seqno == expected_seqno:
-                return i
-        return -1
-
-    def ptp_send(self):
-        # do the while loop until we establish with receiver
-        while self.state != ESTABLISHED:
-            if self.state == CLOSED:
-                return
-            continue
-        self.data_acked = self.synced
-        # send every segment from our pre data segmentss
-        while self.i < len(self.data_segments):
-            #send every segments in our window(unsend)
-            while len(self.windows) < self.max_win:
-                if self.i < len(self.data_segments):
-                    data_segment = self.data_segments[self.i]
-                    self.i += 1
-                    self.windows.append(data_segment)
-                    header = Htype.DATA.to_bytes(2, 'big') + data_segment.seqno.to_bytes(2, 'big')
-                    content = header + data_segment.data
-                    # set the time we sent it
-                    data_segment.last_send_time = time.time()
-                    self.write_log('snd', Htype.DATA, data_segment.seqno, len(data_segment.data))
-                    self.sender_socket.sendto(content, self.receiver_address)
-                    self.dtb += len(data_segment.data)
-                    self.dss += 1
-                    if self.data_timer is None:
-                        self.data_timer = Thread(target=self.data_timeout)
-                        self.data_timer.start()
-                    if self.i == len(self.data_segments):
-                        self.state = CLOSING
-                        return
-
-    def ptp_close(self):
-        # while loop stop until we send fin segment
-        while self.state != FIN_WAIT and self.state != CLOSED:
-            continue
-        if self.state == FIN_WAIT:
-            self.fined = False
-            self.write_log('snd', Htype.FIN, self.seqno_for_fin_wait, 0)
-            header = Htype.FIN.to_bytes(2, 'big') + self.seqno_for_fin_wait.to_bytes(2, 'big')
-            self.sender_socket.sendto(header, self.receiver_address)
-            self.retry_times = 0
-            self.curr_packet_time = time.time()
-
-            self.fin_timer.start()
-            time.sleep(5)
-            self._is_active = False
-            self.sender_socket.close()
-            logging.info(f'Amount of (original) Data Transferred {self.dtb}')
-            logging.info(f'Number of Data Segments Sent {self.dss}')
-            logging.info(f'Number of Retransmitted Data Segments {self.rds}')
-            logging.info(f'Number of Duplicate Acknowledgements received {self.rda}')
-        elif self.state == CLOSED:
-            time.sleep(5)
-            self.sender_socket.close()
-
-    def listen(self):
-
-        # the current sender state is active and syn segment already sent
-        while self._is_active:
-            try:
-                incoming_message, receiver_address = self.sender_socket.recvfrom(BUFFERSIZE)
-            except:
-                break
-            seqno = int.from_bytes(incoming_message[2:4], byteorder='big')
-            header_type = int.from_bytes(incoming_message[0:2], byteorder='big')
-            self.write_log('rcv', header_type, seqno, len(incoming_message[4:]))
-            # check if we receive correct syn segment
-            if seqno == self.expected_ack_seqno_for_syn:
-                if self.state == SYN_SENT:
-                    self.state = ESTABLISHED
-                    self.synced = True
-                else:
-                    self.rda += 1
-
-             # check if we receive correct fin segment
-            elif seqno == self.expected_ack_seqno_for_fin:
-                if self.state == FIN_WAIT:
-                    self.state = CLOSED
-                    self._is_active = False
-                    self.fined = True
-                else:
-                    self.rda += 1
-            else:
-                # check if we receive data segment
-                index_in_windows = self.get_index_in_windows(seqno)
-                if index_in_windows == -1:
-                    self.rda += 1
-                else:
-                    # update the segment state if we receive thhe data segment ack
-                    if self.windows[index_in_windows].acked is False:
-                        self.windows[index_in_windows].acked = True
-                    else:
-                        self.rda += 1
-                    while True:
-                        # we finish send all data segments
-                        if len(self.windows) == 0:
-                            if self.state == CLOSING:
-                                self.state = FIN_WAIT
-                            break
-                        if self.windows[0].acked is False:
-                            break
-                        del self.windows[0]
-
-    def send_syn(self):
-        self.state = SYN_SENT
-        header_type = Htype.SYN
-        header = header_type.to_bytes(2, 'big') + self.start_seqno.to_bytes(2, 'big')
-        self.write_log("snd", Htype.SYN, self.start_seqno, 0)
-        self.sender_socket.sendto(header, self.receiver_address)
-        # set current syn segment send time
-        self.curr_packet_time = time.time()
-
-    def run(self):
-        '''
-        This function contain the main logic of the receiver
-        '''
-
-        self.ptp_open()
-        self.ptp_send()
-        self.ptp_close()
-
-    def write_log(self, action, packet_type, seqno, size):
-        packet_type = get_type(packet_type)
-        current_time = datetime.datetime.timestamp(datetime.datetime.now())
-        interval = (current_time - self.start_time) * 1000
-        log = '{:<8}\t{:<10.2f}\t{:<8}\t{:<8}\t{:<8}'.format(action, interval, packet_type, str(seqno), str(size))
-        logging.info(log)
-
-
-if __name__ == '__main__':
-    # logging is useful for the log part: https://docs.python.org/3/library/logging.html
-    logging.basicConfig(
-        filename="Sender_log.txt",
-        level=logging.INFO,
-        format='',
-        filemode='w')
-
-    if len(sys.argv) != 6:
-        print(
-            "\n===== Error usage, python3 sender.py sender_port receiver_port FileReceived.txt max_win rot ======\n")
-        exit(0)
-
-    sender = Sender(*sys.argv[1:])
-    sender.run()
+"""
+    Sample code for Sender (multi-threading)
+    Python 3
+    Usage: python3 sender.py receiver_port sender_port FileToSend.txt max_recv_win rto [dup_ack_threshold] [--cc reno] [--header-version 3]
+                                                                                         [--mss 1000] [--pace 20M|rtt]
+                                                                                         [--pace-burst 2] [--log text|binary|off]
+                                                                                         [--metrics FILE.json|FILE.prom]
+                                                                                         [--metrics-interval SECONDS]
+    coding: utf-8
+
+    Notes:
+        Try to run the server first with the command:
+            python3 receiver.py 9000 10000 FileReceived.txt 1 1
+        Then run the sender:
+            python3 sender.py 11000 9000 FileToReceived.txt 1000 1
+
+    Author: Rui Li (Tutor for COMP3331/9331)
+"""
+# here are the libs you may find it useful:
+import datetime, time
+import os
+import threading
+import signal
+import random  # to calculate the time delta of packet transmission
+import logging, sys  # to write the log
+import argparse  # for the optional arguments
+import socket  # Core lib, to send packet via UDP socket
+from threading import Thread  # (Optional)threading will make the timer easily implemented
+from header_type import Htype, get_type, unpack_sack  # a class contain all segment header type
+from header_type import HEADER_V1, HEADER_V2, HEADER_V3, HEADER_VERSIONS, get_seq_space, make_header, parse_header
+from header_type import get_header_size, get_message_version, verify_checksum, has_checksum, new_digest, is_syn_ack
+from header_type import DEFAULT_MSS, MAX_MSS
+from header_type import pack_syn_options, unpack_syn_ack_options, ACK_CUMULATIVE
+from header_type import add_options_checksum, verify_options_checksum
+from timer import TimerScheduler  # one thread drive all the retransmission timers
+from state_machine import StateMachine  # let the sending thread block until the state changes
+from rto import RtoEstimator  # adaptive retransmission timeout from the RTT samples
+from window import SendWindow  # ring buffer of the segments in flight
+from batch_io import BatchSocket  # drain the acks per wakeup, send without copying the payload
+from congestion import get_congestion_control, CONGESTION_CONTROLS  # cwnd/ssthresh of the sender window
+from pacer import Pacer, PACE_BURST, parse_rate  # token bucket which spreads the window over time
+from event_log import setup_log, LOG_LEVELS, LOG_TEXT  # text, binary or no packet log
+from metrics import Metrics, METRICS_INTERVAL, RTT_BUCKETS, OCCUPANCY_BUCKETS  # live metrics of the transfer
+from metrics import RETRANSMIT_CAUSES, RETRANSMIT_TIMEOUT, RETRANSMIT_DUP_ACK
+
+
+BUFFERSIZE = 1024
+
+# max time to resend segment
+MAX_RETRY = 3
+
+# number of duplicate acks for the oldest unack segment which trigger a fast retransmit
+DUP_ACK_THRESHOLD = 3
+
+DEFAULT_CONGESTION_CONTROL = 'reno'
+
+CLOSED = 0
+SYN_SENT = 1
+ESTABLISHED = 2
+CLOSING = 3
+FIN_WAIT = 4
+STATE_NAMES = {CLOSED: 'CLOSED', SYN_SENT: 'SYN_SENT', ESTABLISHED: 'ESTABLISHED', CLOSING: 'CLOSING',
+               FIN_WAIT: 'FIN_WAIT'}
+
+
+class Data_Segment:
+    def __init__(self, index, seqno, data, expected_seqno, acked=False, last_send_time=0):
+        self.index = index
+        self.seqno = seqno
+        self.data = data
+        self.expected_seqno = expected_seqno
+        self.acked = acked
+        self.last_send_time = last_send_time
+        # Karn's algorithm: no RTT sample from a segment which has been sent more than once
+        self.retransmitted = False
+
+
+class Segment_Reader:
+    def __init__(self, filename, first_seqno, seq_space=2 ** 16, segment_size=DEFAULT_MSS, stripe=None,
+                 digest=False):
+        '''
+        Read the file as binary segments on demand, so only the segments in the window are
+        kept in memory and the first one can go out before the rest of the file is read.
+        :param first_seqno: the seqno of the first data byte (the syn seqno + 1)
+        :param seq_space: the seqnos are modulo seq_space, it depends on the header version
+        :param stripe: (offset, length) to only read that byte range of the file
+        :param digest: keep the digest of the data read, the fin sends it to the receiver
+        '''
+        self.file = open(filename, 'rb')
+        self.digest = new_digest() if digest else None
+        self.size = os.path.getsize(filename)
+        if stripe is not None:
+            offset, length = stripe
+            self.file.seek(offset)
+            self.size = max(min(length, self.size - offset), 0)
+        self.seq_space = seq_space
+        self.segment_size = segment_size
+        self.offset = 0
+        self.seqno = first_seqno
+        # the seqno after the last data byte, used by the fin segment
+        self.end_seqno = (first_seqno + self.size) % self.seq_space
+
+    def has_next(self):
+        return self.offset < self.size
+
+    def next_segment(self):
+        data = self.file.read(min(self.segment_size, self.size - self.offset))
+        if self.digest is not None:
+            self.digest.update(data)
+        expected_seqno = (self.seqno + len(data)) % self.seq_space
+        data_segment = Data_Segment(self.offset, self.seqno, data, expected_seqno, False, 0)
+        self.offset += len(data)
+        self.seqno = expected_seqno
+        return data_segment
+
+    def close(self):
+        self.file.close()
+
+
+class Sender:
+    def __init__(self, sender_port: int, receiver_port: int, filename: str, max_win: int, rot: int,
+                 dup_ack_threshold: int = DUP_ACK_THRESHOLD, cc: str = DEFAULT_CONGESTION_CONTROL,
+                 header_version: int = HEADER_V3, mss: int = DEFAULT_MSS, stripe: tuple = None, pace=None,
+                 pace_burst: int = PACE_BURST, event_log=None, metrics_file: str = None,
+                 metrics_interval: float = METRICS_INTERVAL) -> None:
+        '''
+        The Sender will be able to connect the Receiver via UDP
+        :param sender_port: the UDP port number to be used by the sender to send PTP segments to the receiver
+        :param receiver_port: the UDP port number on which receiver is expecting to receive PTP segments from the sender
+        :param filename: the name of the text file that must be transferred from sender to receiver using your reliable transport protocol.
+        :param max_win: the maximum window size in bytes for the sender window.
+        :param rot: the initial value of the retransmission timer in milliseconds, then it adapts to the measured RTT.
+        :param dup_ack_threshold: number of duplicate acks which trigger a fast retransmit of the oldest unack segment.
+        :param cc: the congestion control algorithm (fixed, reno or cubic), the window is min(cwnd, max_win).
+        :param header_version: the highest header version offered in the SYN, 2 for 32 bits seqnos and large windows,
+                               3 adds a checksum to every segment and the file digest to the FIN.
+        :param mss: the segment size offered in the SYN, the receiver may lower it, version 1 always use 1000 bytes.
+        :param stripe: (offset, length) of the byte range to send in a striped transfer, None for the whole file.
+        :param pace: pace the data segments at this rate in bytes per second, or 'rtt' to spread the window over
+                     the smoothed RTT, None sends the window back to back.
+        :param pace_burst: max data segments the pacer sends back to back.
+        :param event_log: the EventLog which records the packets in binary, None to write the text log.
+        :param metrics_file: the file rewritten with the metrics during the transfer, Prometheus text if it ends
+                             with .prom, JSON otherwise, None to not write them.
+        :param metrics_interval: seconds between two writes of the metrics file.
+        '''
+        self.sender_port = int(sender_port)
+        self.receiver_port = int(receiver_port)
+        self.sender_address = ("127.0.0.1", self.sender_port)
+        self.receiver_address = ("127.0.0.1", self.receiver_port)
+
+        self.filename = filename
+        self.stripe = stripe
+        self.event_log = event_log
+        # the window in segments is known once the mss is negotiated
+        self.max_win_bytes = int(max_win)
+        self.offered_mss = min(int(mss), MAX_MSS)
+        self.mss = DEFAULT_MSS
+        self.max_win = self.max_win_bytes // self.mss
+        self.congestion_control = get_congestion_control(cc, self.max_win)
+        self.rot = int(rot)
+        self.rto_estimator = RtoEstimator(self.rot)
+        self.windows = SendWindow(self.max_win)  # type: SendWindow
+        # at start the sender is in closed state
+        self.state_machine = StateMachine(CLOSED)
+        self.metrics = Metrics('sender', STATE_NAMES, CLOSED, {'rtt_ms': RTT_BUCKETS, 'window_occupancy': OCCUPANCY_BUCKETS},
+                               RETRANSMIT_CAUSES)
+        self.metrics_file = metrics_file
+        self.metrics_interval = float(metrics_interval)
+        # the header version is version 1 until the receiver accept a higher one in the syn ack
+        self.offered_header_version = int(header_version)
+        self.header_version = HEADER_V1
+        self.seq_space = get_seq_space(HEADER_V1)
+        # get a random 32 bits sequence number, the syn carries its low 16 bits in the header
+        self.start_seqno = random.randint(1, 2 ** 32 - 1)
+        self.expected_ack_seqno_for_syn = (self.start_seqno + 1) % 2 ** 16
+
+        self._is_active = True  # for the multi-threading
+
+        self.start_time = 0
+        # current segment time we observing
+        self.curr_packet_time = 0
+        # count the number of data segment we have
+        self.i = 0
+        # the send retry time
+        self.retry_times = 0
+
+        self.syn_retry = 0
+        self.fin_retry = 0
+        self.base = 0
+        # check if all packet has been acked
+        self.all_packets_acked = False
+        self.synced = False
+        self.data_acked = False
+        self.fined = False
+        self.syn_timer = None
+        self.fin_timer = None
+        self.data_timer = None
+        # the send, listen and timer threads all arm the data timer, the window is checked and
+        # data_timer set under this lock so none of them can clear a timer another one needs
+        self.data_timer_lock = threading.Lock()
+        # read the data segments lazily while the window advances, it is opened once the
+        # handshake has chosen the seqno size
+        os.stat(self.filename)
+        self.segment_reader = None
+        self.seqno_for_fin_wait = 0
+        self.expected_ack_seqno_for_fin = 0
+
+        self.dss = 0  # Number of Data Segments Sent
+        self.dtb = 0  # Amount of (original) Data Transferred
+        self.rds = 0  # Number of Retransmitted Data Segments
+        self.rda = 0  # 'Number of Duplicate Acknowledgements received
+        self.frs = 0  # Number of Fast Retransmissions
+        self.cas = 0  # Number of corrupted ACK segments dropped
+
+        self.dup_ack_threshold = int(dup_ack_threshold)
+        # the oldest unack segment we are counting duplicate acks for
+        self.dup_ack_seqno = None
+        self.dup_ack_count = 0
+        # the receiver reports SACK blocks, so unack segments before an acked one are real holes
+        self.sack_seen = False
+        # the receiver acks cumulatively, one ack covers every segment before it
+        self.cumulative_ack = False
+        self.last_retransmit_time = 0
+        # the token bucket refills at the pacing rate, its size is set again once the mss is negotiated
+        self.pace_burst = int(pace_burst)
+        self.pacer = Pacer(pace, self.pace_burst * self.mss) if pace is not None else None
+        # seconds before the pacer lets the next segment go, 0 when it is not holding one back
+        self.pacing_delay = 0
+        self.open_transport()
+
+    # init the UDP socket, the listen thread and the timers once every attribute is set
+    def open_transport(self):
+        self.sender_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.sender_socket.bind(self.sender_address)
+        self.batch_socket = BatchSocket(self.sender_socket, BUFFERSIZE)
+        # daemon so a sender closed by RESET does not hang on the blocking recvfrom
+        self.listen_thread = Thread(target=self.listen, daemon=True)
+        self.listen_thread.start()
+        # all the timeouts are events in the scheduler instead of polling threads
+        self.timers = TimerScheduler()
+    
+    @property
+    def state(self):
+        return self.state_machine.state
+
+    # every state change wakes up the thread waiting in ptp_send/ptp_close
+    @state.setter
+    def state(self, state):
+        self.state_machine.set(state)
+        self.metrics.set_state(state)
+
+    # called by the timer when the syn segment timeout
+    def syn_timeout(self):
+        if not self._is_active or self.state != SYN_SENT or self.synced:
+            return
+        # if we still can't receive the syn ack then we will send reset segment
+        if self.syn_retry >= MAX_RETRY:
+            self.send_reset()
+        else:
+            # try to resend asain
+            self.syn_retry += 1
+            self.rto_estimator.backoff()
+            self.write_log('snd', Htype.SYN, self.start_seqno % 2 ** 16, 0)
+            # set the send time first, the syn ack may be handled before send returns
+            self.curr_packet_time = time.time()
+            self.syn_timer = self.timers.schedule(self.get_rto(), self.syn_timeout)
+            self.batch_socket.send(self.get_syn_segment(), b'', self.receiver_address)
+
+    # called by the timer when the fin segment timeout
+    def fin_timeout(self):
+        if not self._is_active or self.state != FIN_WAIT or self.fined:
+            return
+        # if we still can't receive the fin ack then we will send reset segment
+        if self.fin_retry >= MAX_RETRY:
+            self.send_reset()
+        else:
+            # try to resend asain
+            self.fin_retry += 1
+            self.rto_estimator.backoff()
+            self.write_log('snd', Htype.FIN, self.seqno_for_fin_wait, 0)
+            self.send_fin_segment()
+            self.curr_packet_time = time.time()
+            self.fin_timer = self.timers.schedule(self.get_rto(), self.fin_timeout)
+
+    # current retransmission timeout in seconds
+    def get_rto(self):
+        return self.rto_estimator.rto / 1000
+
+    def send_reset(self):
+        self._is_active = False
+        self.state = CLOSED
+        seqno = 0
+        self.write_log('snd', Htype.RESET, seqno, 0)
+        # after a version 3 handshake the reset has a checksum too
+        headers = make_header(Htype.RESET, seqno, self.header_version if has_checksum(self.header_version) else HEADER_V1)
+        self.batch_socket.send(headers, b'', self.receiver_address)
+
+    def get_first_non_acked_in_windows(self):
+        return self.windows.first_non_acked()
+
+    # arm the data timer for the oldest unack segment, nothing is scheduled while the window is empty,
+    # restart=False keeps the timer already running
+    def start_data_timer(self, restart=True):
+        with self.data_timer_lock:
+            if self.data_timer is not None:
+                if not restart:
+                    return
+                self.data_timer.cancel()
+            data_segment = self.get_first_non_acked_in_windows()
+            if data_segment is None:
+                self.data_timer = None
+                return
+            delay = data_segment.last_send_time + self.get_rto() - time.time()
+            self.data_timer = self.timers.schedule(delay, self.data_timeout)
+
+    # called by the timer when the oldest unack segment may have timeout
+    def data_timeout(self):
+        if not self._is_active or self.state not in [ESTABLISHED, CLOSING]:
+            with self.data_timer_lock:
+                self.data_timer = None
+            return
+        data_segment = self.get_first_non_acked_in_windows()
+        # if we can't get that segment ack we will send the segment again
+        if data_segment is not None and time.time() - data_segment.last_send_time >= self.get_rto():
+            self.rto_estimator.backoff()
+            self.congestion_control.on_timeout(time.time())
+            self.retransmit(data_segment, RETRANSMIT_TIMEOUT)
+        self.start_data_timer()
+
+    def retransmit(self, data_segment, cause):
+        self.rds += 1
+        self.metrics.retransmit(cause)
+        data_segment.retransmitted = True
+        self.last_retransmit_time = time.time()
+        self.write_log('snd', Htype.DATA, data_segment.seqno, len(data_segment.data))
+        header = make_header(Htype.DATA, data_segment.seqno, self.header_version, data_segment.data)
+        data_segment.last_send_time = time.time()
+        self.batch_socket.send(header, data_segment.data, self.receiver_address)
+
+    # an ack which does not move the window means the oldest unack segment is probably lost,
+    # resend it without waiting for the timer once we get dup_ack_threshold of them
+    def check_fast_retransmit(self):
+        data_segment = self.windows[0]
+        if data_segment.seqno != self.dup_ack_seqno:
+            self.dup_ack_seqno = data_segment.seqno
+            self.dup_ack_count = 0
+        self.dup_ack_count += 1
+        if self.dup_ack_count == self.dup_ack_threshold:
+            self.frs += 1
+            self.congestion_control.on_loss(time.time())
+            if self.sack_seen:
+                for hole in self.get_holes_in_windows():
+                    self.retransmit(hole, RETRANSMIT_DUP_ACK)
+            else:
+                self.retransmit(data_segment, RETRANSMIT_DUP_ACK)
+
+    # the unack segments sent before the last acked one in the window
+    def get_holes_in_windows(self):
+        holes = []
+        unacked = []
+        for data_segment in self.windows:
+            if data_segment.acked:
+                holes.extend(unacked)
+                unacked = []
+            else:
+                unacked.append(data_segment)
+        return holes
+
+    # mark every segment before the cumulative ack or inside a SACK block as acked
+    def mark_sacked(self, cumulative_seqno, blocks):
+        index = self.windows.index(cumulative_seqno)
+        if index != -1:
+            # start from the oldest unack segment, the ones before are already acked
+            data_segment = self.windows.first_non_acked()
+            while data_segment is not None and self.windows.index(data_segment.expected_seqno) <= index:
+                self.ack_segment(data_segment)
+                data_segment = self.windows.first_non_acked()
+        for start, end in blocks:
+            self.sack_seen = True
+            length = (end - start) % self.seq_space
+            # walk the segments of the block one after another from its start seqno
+            data_segment = self.windows.get_by_seqno(start)
+            while data_segment is not None and (data_segment.expected_seqno - start) % self.seq_space <= length:
+                if data_segment.acked is False:
+                    self.ack_segment(data_segment)
+                if data_segment.expected_seqno == end:
+                    break
+                data_segment = self.windows.get_by_seqno(data_segment.expected_seqno)
+
+    def ack_segment(self, data_segment):
+        data_segment.acked = True
+        self.congestion_control.on_ack(time.time())
+        self.metrics.deliver(len(data_segment.data))
+
+    def sample_rtt(self, rtt):
+        self.rto_estimator.sample(rtt)
+        self.metrics.observe('rtt_ms', rtt)
+
+    def ptp_open(self):
+        self.start_time = datetime.datetime.timestamp(datetime.datetime.now())
+        if self.event_log is not None:
+            self.event_log.mark_start()
+        if self.metrics_file is not None:
+            self.export_metrics()
+        self.send_syn()
+    
+    # number of segments we can have in flight, the congestion window capped by max_win
+    def get_window_limit(self):
+        return max(1, min(int(self.congestion_control.cwnd), self.max_win))
+
+    # get the except segment from the window
+    def get_index_in_windows(self, expected_seqno):
+        return self.windows.index(expected_seqno)
+
+    def ptp_send(self):
+        # block until we establish with receiver
+        self.state_machine.wait_for(lambda: self.state in [ESTABLISHED, CLOSED])
+        if self.state == CLOSED:
+            return
+        self.data_acked = self.synced
+        self.open_segment_reader()
+        # nothing to send, go to close straight away
+        if not self.segment_reader.has_next():
+            self.state = FIN_WAIT
+            return
+        # send every segment read from the file
+        while self.segment_reader.has_next():
+            # block until the listen thread opens space in the window
+            self.state_machine.wait_for(lambda: len(self.windows) < self.get_window_limit() or self.state == CLOSED)
+            if self.state == CLOSED:
+                return
+            if self.send_window():
+                return
+            # the pacer holds the next segment back, wait for its tokens
+            if self.pacing_delay > 0:
+                self.state_machine.wait_for(lambda: self.state == CLOSED, self.pacing_delay)
+
+    # send every segments in our window(unsend) together in one batch, return True once the last one is out
+    def send_window(self):
+        batch = []
+        self.pacing_delay = 0
+        if self.pacer is not None:
+            self.pacer.pace_rtt(self.get_window_limit() * self.mss, self.rto_estimator.srtt)
+        while len(self.windows) < self.get_window_limit() and self.segment_reader.has_next():
+            if self.pacer is not None:
+                self.pacing_delay = self.pacer.delay(self.mss)
+                if self.pacing_delay > 0:
+                    break
+            data_segment = self.segment_reader.next_segment()
+            if self.pacer is not None:
+                self.pacer.consume(len(data_segment.data))
+            self.i += 1
+            header = make_header(Htype.DATA, data_segment.seqno, self.header_version, data_segment.data)
+            # set the time we sent it
+            data_segment.last_send_time = time.time()
+            self.windows.append(data_segment)
+            self.write_log('snd', Htype.DATA, data_segment.seqno, len(data_segment.data))
+            batch.append((header, data_segment.data))
+            self.dtb += len(data_segment.data)
+            self.dss += 1
+        if batch:
+            self.metrics.observe('window_occupancy', len(self.windows) / self.get_window_limit())
+        # change the state before the last segment is out, its ack may come back at any time
+        last_segment = not self.segment_reader.has_next()
+        if last_segment:
+            self.state = CLOSING
+        self.batch_socket.send_batch(batch, self.receiver_address)
+        self.start_data_timer(restart=False)
+        return last_segment
+
+    def ptp_close(self):
+        if self.segment_reader is not None:
+            self.segment_reader.close()
+        # block until every data segment has been acked
+        self.state_machine.wait_for(lambda: self.state in [FIN_WAIT, CLOSED])
+        if self.state == FIN_WAIT:
+            self.send_fin()
+            # the fin ack or the reset after MAX_RETRY both move us to CLOSED
+            self.state_machine.wait_for(lambda: self.state == CLOSED)
+            self._is_active = False
+            self.timers.stop()
+            self.sender_socket.close()
+            self.log_stats()
+        elif self.state == CLOSED:
+            self.timers.stop()
+            self.sender_socket.close()
+        if self.metrics_file is not None:
+            self.export_metrics()
+
+    def send_fin(self):
+        self.fined = False
+        self.write_log('snd', Htype.FIN, self.seqno_for_fin_wait, 0)
+        # arm the timer before sending so the ack can always cancel it
+        self.fin_timer = self.timers.schedule(self.get_rto(), self.fin_timeout)
+        self.send_fin_segment()
+        self.retry_times = 0
+        self.curr_packet_time = time.time()
+
+    # the fin of version 3 carries the digest of the whole file, the receiver checks it against its own
+    def send_fin_segment(self):
+        payload = b''
+        if self.segment_reader.digest is not None:
+            payload = self.segment_reader.digest.digest()
+        header = make_header(Htype.FIN, self.seqno_for_fin_wait, self.header_version, payload)
+        self.batch_socket.send(header, payload, self.receiver_address)
+
+    # rewrite the metrics file, then again every metrics_interval while the connection is open
+    def export_metrics(self):
+        self.metrics.write(self.metrics_file, self.get_gauges())
+        if self._is_active:
+            self.timers.schedule(self.metrics_interval, self.export_metrics)
+
+    # the current values written with the metrics
+    def get_gauges(self):
+        gauges = {
+            'data_transferred_bytes': self.dtb,
+            'data_segments_sent': self.dss,
+            'retransmitted_segments': self.rds,
+            'duplicate_acks': self.rda,
+            'fast_retransmits': self.frs,
+            'corrupted_acks_dropped': self.cas,
+            'segments_in_flight': len(self.windows),
+            'window_limit_segments': self.get_window_limit(),
+            'cwnd_segments': round(self.congestion_control.cwnd, 2),
+            'ssthresh_segments': round(self.congestion_control.ssthresh, 2),
+            'srtt_ms': round(self.rto_estimator.srtt or 0, 3),
+            'rttvar_ms': round(self.rto_estimator.rttvar or 0, 3),
+            'rto_ms': round(self.rto_estimator.rto, 3),
+        }
+        if self.pacer is not None:
+            gauges['pacing_rate_bytes_per_second'] = round(self.pacer.rate, 1)
+        return gauges
+
+    def log_stats(self):
+        logging.info(f'Amount of (original) Data Transferred {self.dtb}')
+        logging.info(f'Number of Data Segments Sent {self.dss}')
+        logging.info(f'Number of Retransmitted Data Segments {self.rds}')
+        logging.info(f'Number of Duplicate Acknowledgements received {self.rda}')
+        logging.info(f'Number of Fast Retransmissions {self.frs}')
+        if has_checksum(self.header_version):
+            logging.info(f'Number of corrupted ACK segments dropped {self.cas}')
+        if self.pacer is not None:
+            self.log_pacing()
+        self.log_rto()
+
+    def log_pacing(self):
+        rate = 'rtt' if self.pacer.rtt_mode else f'{self.pacer.rate * 8 / 1e6:.2f}'
+        logging.info(f'Pacing Rate (Mbit/s) {rate}')
+        logging.info(f'Achieved Rate (Mbit/s) {self.pacer.get_achieved_rate() * 8 / 1e6:.2f}')
+        logging.info(f'Average Pacing Queue Delay (ms) {self.pacer.get_queue_delay():.2f}')
+
+    def log_rto(self):
+        srtt = self.rto_estimator.srtt or 0
+        rttvar = self.rto_estimator.rttvar or 0
+        logging.info(f'Smoothed RTT (ms) {srtt:.2f}')
+        logging.info(f'RTT Variation (ms) {rttvar:.2f}')
+        logging.info(f'Retransmission Timeout (ms) {self.rto_estimator.rto:.2f}')
+        logging.info(f'Congestion Control {self.congestion_control.name}')
+        logging.info(f'Congestion Window (segments) {self.congestion_control.cwnd:.2f}')
+        logging.info(f'Slow Start Threshold (segments) {self.congestion_control.ssthresh:.2f}')
+
+    def listen(self):
+
+        # the current sender state is active and syn segment already sent
+        while self._is_active:
+            try:
+                batch = self.batch_socket.recv_batch()
+            except:
+                break
+            for incoming_message, receiver_address in batch:
+                self.handle_ack(incoming_message)
+
+    # handle one ack segment from the receiver
+    def handle_ack(self, incoming_message):
+        # the syn ack always use the version 1 header
+        header_version = HEADER_V1 if self.state == SYN_SENT else get_message_version(incoming_message,
+                                                                                       self.header_version)
+        if len(incoming_message) < get_header_size(header_version):
+            return
+        # a late copy of the syn ack keeps its version 1 header, it is not a corrupted ack
+        if header_version != HEADER_V1 and is_syn_ack(incoming_message):
+            header_type, seqno, payload = parse_header(incoming_message, HEADER_V1)
+            if seqno == self.expected_ack_seqno_for_syn:
+                self.write_log('rcv', header_type, seqno, 0)
+                return
+        header_type, seqno, payload = parse_header(incoming_message, header_version)
+        # a corrupted ack is dropped, the next one acks the same segments, the syn is
+        # retransmitted until a syn ack with valid options comes back
+        if not verify_checksum(incoming_message, header_version) \
+                or (self.state == SYN_SENT and not verify_options_checksum(incoming_message)):
+            self.write_log('drp', Htype.CORRUPT, seqno, 0)
+            self.cas += 1
+            return
+        # an ack carries no data, its payload is only options or SACK blocks
+        self.write_log('rcv', header_type, seqno, 0)
+        # the receiver gives up on the transfer, its file does not match our digest
+        if header_type == Htype.RESET:
+            print('a closure of the connection due to a RESET packet')
+            self._is_active = False
+            self.state = CLOSED
+            return
+        # check if we receive correct syn segment, a data ack can have the same seqno
+        # once the sequence space wraps around so the state decide which one it is
+        if self.state == SYN_SENT and seqno == self.expected_ack_seqno_for_syn:
+            self.syn_timer.cancel()
+            if self.syn_retry == 0:
+                self.sample_rtt((time.time() - self.curr_packet_time) * 1000)
+            self.negotiate(payload)
+            if self.state == CLOSED:
+                return
+            self.synced = True
+            self.state = ESTABLISHED
+
+         # check if we receive correct fin segment
+        elif self.state == FIN_WAIT and seqno == self.expected_ack_seqno_for_fin:
+            self.state = CLOSED
+            self._is_active = False
+            self.fined = True
+            self.fin_timer.cancel()
+        else:
+            # check if we receive data segment
+            index_in_windows = self.get_index_in_windows(seqno)
+            advanced = False
+            if index_in_windows == -1:
+                self.rda += 1
+            else:
+                # update the segment state if we receive thhe data segment ack
+                data_segment = self.windows[index_in_windows]
+                if data_segment.acked is False:
+                    self.ack_segment(data_segment)
+                    if not data_segment.retransmitted and not self.is_ack_held_by_hole(data_segment):
+                        self.sample_rtt((time.time() - data_segment.last_send_time) * 1000)
+                else:
+                    self.rda += 1
+            if self.cumulative_ack:
+                self.mark_sacked(seqno, [])
+            if len(payload) > 0:
+                self.mark_sacked(*unpack_sack(payload, self.header_version))
+            if len(self.windows) > 0:
+                advanced = self.windows.slide()
+                # we finish send all data segments
+                if len(self.windows) == 0 and self.state == CLOSING:
+                    self.state = FIN_WAIT
+                # the window may have space now
+                self.state_machine.notify()
+            # new data acked: restart the timer for the oldest unack segment without the backoff
+            if advanced:
+                self.rto_estimator.reset_backoff()
+                self.start_data_timer()
+            if not advanced and len(self.windows) > 0:
+                self.check_fast_retransmit()
+
+    # a cumulative ack may be held back by a hole before the segment until its retransmission
+    # arrives, Karn's algorithm does not sample it either
+    def is_ack_held_by_hole(self, data_segment):
+        return self.cumulative_ack and self.last_retransmit_time > data_segment.last_send_time
+
+    # the syn offers the header version in its payload, a version 1 receiver just ignores it
+    def get_syn_segment(self):
+        header = make_header(Htype.SYN, self.start_seqno % 2 ** 16)
+        if self.offered_header_version == HEADER_V1:
+            return header
+        stripe = None
+        if self.stripe is not None:
+            # the receiver needs the size of the whole file to preallocate it
+            stripe = (self.stripe[0], os.path.getsize(self.filename))
+        options = pack_syn_options(self.offered_header_version, self.start_seqno, self.offered_mss, stripe)
+        return header + add_options_checksum(header, options)
+
+    # apply the options of the syn ack: header version, receive window and mss
+    def negotiate(self, payload):
+        header_version, recv_win, mss, flags, ack_delay = unpack_syn_ack_options(payload)
+        self.cumulative_ack = bool(flags & ACK_CUMULATIVE)
+        # an ack may come up to ack_delay later than the RTT, do not time out before it
+        if ack_delay:
+            self.rto_estimator.min_rto += ack_delay
+            self.rto_estimator.rto = self.rto_estimator.clamp(self.rto_estimator.rto)
+        # a receiver without syn options has dropped the offset of our stripe
+        if recv_win is None and self.stripe is not None:
+            print('the receiver does not support striped transfers')
+            self.send_reset()
+            return
+        if HEADER_V2 <= header_version <= self.offered_header_version:
+            self.header_version = header_version
+            self.mss = min(mss, self.offered_mss)
+        self.seq_space = get_seq_space(self.header_version)
+        max_win = self.max_win_bytes
+        if recv_win is not None:
+            max_win = min(max_win, recv_win)
+        # the receiver tells old segments from new ones with half of the sequence space
+        max_win = min(max_win, self.seq_space // 2 - 1)
+        self.max_win = max(max_win // self.mss, 1)
+        self.windows = SendWindow(self.max_win)
+        self.congestion_control = get_congestion_control(self.congestion_control.name, self.max_win)
+        if self.pacer is not None:
+            self.pacer.burst = self.pace_burst * self.mss
+
+    def open_segment_reader(self):
+        self.segment_reader = Segment_Reader(self.filename, (self.start_seqno + 1) % self.seq_space, self.seq_space,
+                                             self.mss, self.stripe, has_checksum(self.header_version))
+        self.seqno_for_fin_wait = self.segment_reader.end_seqno
+        self.expected_ack_seqno_for_fin = (self.seqno_for_fin_wait + 1) % self.seq_space
+
+    def send_syn(self):
+        self.state = SYN_SENT
+        self.write_log("snd", Htype.SYN, self.start_seqno % 2 ** 16, 0)
+        # arm the timer before sending so the ack can always cancel it
+        self.syn_timer = self.timers.schedule(self.get_rto(), self.syn_timeout)
+        # set current syn segment send time, the first RTT sample is taken from it when the syn ack comes
+        self.curr_packet_time = time.time()
+        self.batch_socket.send(self.get_syn_segment(), b'', self.receiver_address)
+
+    def run(self):
+        '''
+        This function contain the main logic of the receiver
+        '''
+
+        self.ptp_open()
+        self.ptp_send()
+        self.ptp_close()
+
+    def write_log(self, action, packet_type, seqno, size):
+        if self.event_log is not None:
+            self.event_log.log(action, packet_type, seqno, size)
+            return
+        # nothing to format when the log is off
+        if not logging.getLogger().isEnabledFor(logging.INFO):
+            return
+        packet_type = get_type(packet_type)
+        interval = (time.time() - self.start_time) * 1000
+        log = '{:<8}\t{:<10.2f}\t{:<8}\t{:<8}\t{:<8}'.format(action, interval, packet_type, str(seqno), str(size))
+        logging.info(log)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 6:
+        print(
+            "\n===== Error usage, python3 sender.py sender_port receiver_port FileReceived.txt max_win rot [dup_ack_threshold] [--cc reno] [--header-version 3] ======\n")
+        exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sender_port', type=int)
+    parser.add_argument('receiver_port', type=int)
+    parser.add_argument('filename')
+    parser.add_argument('max_win', type=int)
+    parser.add_argument('rot', type=int)
+    parser.add_argument('dup_ack_threshold', type=int, nargs='?', default=DUP_ACK_THRESHOLD)
+    parser.add_argument('--cc', choices=list(CONGESTION_CONTROLS), default=DEFAULT_CONGESTION_CONTROL,
+                        help='congestion control algorithm')
+    parser.add_argument('--header-version', type=int, choices=HEADER_VERSIONS, default=HEADER_V3,
+                        help='highest header version offered, 1 keeps the 16 bits seqnos, 3 adds the checksums')
+    parser.add_argument('--mss', type=int, default=DEFAULT_MSS, help=f'segment size offered, up to {MAX_MSS} bytes')
+    parser.add_argument('--pace', type=parse_rate, default=None,
+                        help="pacing rate in bits per second (e.g. 500k, 20M) or 'rtt' to spread the window over the RTT")
+    parser.add_argument('--pace-burst', type=int, default=PACE_BURST, help='max segments the pacer sends back to back')
+    parser.add_argument('--log', choices=LOG_LEVELS, default=LOG_TEXT,
+                        help='text log, binary log (Sender_log.bin, see event_log.py) or no log')
+    parser.add_argument('--metrics', dest='metrics_file', default=None,
+                        help='file rewritten with the metrics during the transfer, Prometheus text if it ends with .prom')
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                        help='seconds between two writes of the metrics file')
+    args = vars(parser.parse_args())
+
+    event_log = setup_log("Sender_log.txt", args.pop('log'))
+    sender = Sender(**args, event_log=event_log)
+    # SIGUSR1 doubles and SIGUSR2 halves the pacing rate while the file is sent
+    if sender.pacer is not None and hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: sender.pacer.scale(2))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: sender.pacer.scale(0.5))
+    sender.run()
+    if event_log is not None:
+        event_log.close()
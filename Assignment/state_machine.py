@@ -0,0 +1,32 @@
+# Connection state shared between the sending thread and the listening thread
+import threading
+
+
+class StateMachine:
+    def __init__(self, state) -> None:
+        '''
+        Hold the current connection state behind a condition variable, the sending thread
+        blocks in wait_for() and is woken by the listen thread whenever the state changes
+        or the window moves, instead of spinning on the state.
+        '''
+        self._state = state
+        self._cond = threading.Condition()
+
+    @property
+    def state(self):
+        return self._state
+
+    def set(self, state):
+        with self._cond:
+            self._state = state
+            self._cond.notify_all()
+
+    # wake up the waiting threads so they re-check their condition (e.g. window space opened)
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    # block until predicate() is true, return its last value
+    def wait_for(self, predicate, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
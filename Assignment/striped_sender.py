@@ -0,0 +1,82 @@
+"""
+    Striped transfer: one file sent over N PTP connections at once
+    Python 3
+    Usage: python3 striped_sender.py sender_port receiver_port FileToSend.txt max_win rto [--streams N] [--cc reno]
+                                     [--mss 1000]
+    coding: utf-8
+
+    Notes:
+        The file is cut into N byte ranges, each one is sent by its own Sender in its own worker
+        process, from sender_port, sender_port + 1, ... The SYN of each connection carries the
+        offset of its stripe and the size of the file, so the receiver preallocates the file and
+        writes every stripe at its offset. Receive all the stripes on one port with:
+            python3 ptp_server.py 9000 FileReceived.txt 0 0 --sessions 4
+            python3 striped_sender.py 11000 9000 FileToSend.txt 50000 100 --streams 4
+        max_win is the window of each connection. Each worker logs to Sender_log_<stripe>.txt.
+"""
+import logging, sys  # to write the log
+import argparse  # for the optional arguments
+import os
+import time
+from multiprocessing import Process
+from header_type import HEADER_V3, DEFAULT_MSS, MAX_MSS
+from sender import Sender, DEFAULT_CONGESTION_CONTROL, CONGESTION_CONTROLS
+
+STREAMS = 4
+
+
+# cut size bytes into streams (offset, length) ranges
+def get_stripes(size, streams):
+    length = -(-size // streams)
+    return [(offset, min(length, size - offset)) for offset in range(0, max(size, 1), max(length, 1))]
+
+
+def send_stripe(index, sender_port, receiver_port, filename, max_win, rot, stripe, cc, mss):
+    logging.basicConfig(
+        filename=f"Sender_log_{index}.txt",
+        level=logging.INFO,
+        format='',
+        filemode='w')
+    sender = Sender(sender_port, receiver_port, filename, max_win, rot, cc=cc, header_version=HEADER_V3, mss=mss,
+                    stripe=stripe)
+    sender.run()
+    # the exit code tells the main process if the fin has been acked
+    sys.exit(0 if sender.fined else 1)
+
+
+def send_striped(sender_port, receiver_port, filename, max_win, rot, streams=STREAMS,
+                 cc=DEFAULT_CONGESTION_CONTROL, mss=DEFAULT_MSS):
+    size = os.path.getsize(filename)
+    stripes = get_stripes(size, streams)
+    start_time = time.time()
+    workers = []
+    for index, stripe in enumerate(stripes):
+        worker = Process(target=send_stripe,
+                         args=(index, sender_port + index, receiver_port, filename, max_win, rot, stripe, cc, mss))
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start_time
+    failed = [index for index, worker in enumerate(workers) if worker.exitcode != 0]
+    for index in failed:
+        print(f'stripe {index} {stripes[index]} was not delivered')
+    print(f'{len(stripes) - len(failed)}/{len(stripes)} stripes, {size} bytes in {elapsed:.2f} s '
+          f'({size / elapsed / 1e6:.2f} MB/s)')
+    return not failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sender_port', type=int, help='port of the first stripe, the next ones use the following ports')
+    parser.add_argument('receiver_port', type=int)
+    parser.add_argument('filename')
+    parser.add_argument('max_win', type=int, help='window of each connection in bytes')
+    parser.add_argument('rot', type=int)
+    parser.add_argument('--streams', type=int, default=STREAMS, help='number of connections')
+    parser.add_argument('--cc', choices=list(CONGESTION_CONTROLS), default=DEFAULT_CONGESTION_CONTROL,
+                        help='congestion control algorithm')
+    parser.add_argument('--mss', type=int, default=DEFAULT_MSS, help=f'segment size offered, up to {MAX_MSS} bytes')
+    args = parser.parse_args()
+
+    sys.exit(0 if send_striped(**vars(args)) else 1)
@@ -0,0 +1,69 @@
+# Single-thread timer scheduler shared by all the sender timeouts (SYN, FIN, DATA)
+import heapq
+import itertools
+import threading
+import time
+from threading import Thread
+
+
+class Timer:
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    def __init__(self) -> None:
+        '''
+        Keep every pending timer in a heap ordered by deadline, one thread sleeps on a
+        condition until the earliest deadline (or until a new earlier timer is added)
+        so there is no busy waiting while nothing is due.
+        '''
+        self._heap = []  # type: list[tuple[float, int, Timer]]
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # run callback(*args) after delay seconds, return a handle which can be cancelled
+    def schedule(self, delay, callback, *args):
+        timer = Timer(time.monotonic() + max(delay, 0), callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+            # only wake up the worker if the new timer is now the earliest one
+            if self._heap[0][2] is timer:
+                self._cond.notify()
+        return timer
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    # drop the cancelled timers at the top of the heap
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+                        continue
+                    timer = heapq.heappop(self._heap)[2]
+                    break
+            # run the callback without holding the lock so it can schedule new timers
+            timer.callback(*timer.args)
@@ -0,0 +1,108 @@
+# Sender window as a ring buffer, every ack lookup and window slide is O(1)
+import time
+
+
+class SendWindow:
+    def __init__(self, capacity) -> None:
+        '''
+        Segments are stored in a fixed ring of slots in sending order. Each segment gets an
+        absolute position, the dicts map its (wrapped) seqno and expected seqno to that position
+        so an ack finds its segment without scanning, and first_unacked caches the oldest
+        segment which has not been acked yet.
+        :param capacity: the max number of segments in the window
+        '''
+        self.capacity = max(int(capacity), 1)
+        self.slots = [None] * self.capacity
+        self.head = 0  # absolute position of the oldest segment
+        self.tail = 0  # absolute position of the next segment appended
+        self.first_unacked = 0
+        self.by_seqno = {}
+        self.by_expected_seqno = {}
+
+    def __len__(self):
+        return self.tail - self.head
+
+    # the i-th segment from the oldest one
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError('window index out of range')
+        return self.slots[(self.head + i) % self.capacity]
+
+    def __iter__(self):
+        for position in range(self.head, self.tail):
+            yield self.slots[position % self.capacity]
+
+    def append(self, data_segment):
+        if len(self) == self.capacity:
+            raise IndexError('window is full')
+        self.slots[self.tail % self.capacity] = data_segment
+        self.by_seqno[data_segment.seqno] = self.tail
+        self.by_expected_seqno[data_segment.expected_seqno] = self.tail
+        self.tail += 1
+
+    # position from the oldest segment of the segment acked by expected_seqno, -1 if not in the window
+    def index(self, expected_seqno):
+        position = self.by_expected_seqno.get(expected_seqno)
+        if position is None:
+            return -1
+        return position - self.head
+
+    def get_by_seqno(self, seqno):
+        position = self.by_seqno.get(seqno)
+        if position is None:
+            return None
+        return self.slots[position % self.capacity]
+
+    def first_non_acked(self):
+        # segments never go back to unacked so the cached pointer only moves forward
+        self.first_unacked = max(self.first_unacked, self.head)
+        while self.first_unacked < self.tail and self.slots[self.first_unacked % self.capacity].acked:
+            self.first_unacked += 1
+        if self.first_unacked == self.tail:
+            return None
+        return self.slots[self.first_unacked % self.capacity]
+
+    # drop the acked segments at the start of the window, return True if it moved
+    def slide(self):
+        advanced = False
+        while self.head < self.tail:
+            data_segment = self.slots[self.head % self.capacity]
+            if data_segment.acked is False:
+                break
+            self.slots[self.head % self.capacity] = None
+            # the same seqno may already belong to a newer segment after wrapping around
+            if self.by_seqno.get(data_segment.seqno) == self.head:
+                del self.by_seqno[data_segment.seqno]
+            if self.by_expected_seqno.get(data_segment.expected_seqno) == self.head:
+                del self.by_expected_seqno[data_segment.expected_seqno]
+            self.head += 1
+            advanced = True
+        return advanced
+
+
+# microbenchmark: the cost of one ack should not depend on the window size
+if __name__ == '__main__':
+    class Segment:
+        def __init__(self, seqno, expected_seqno):
+            self.seqno = seqno
+            self.expected_seqno = expected_seqno
+            self.acked = False
+
+    for size in [10, 100, 1000, 10000]:
+        # seqnos here use a 32 bits space so a big window never wraps onto itself
+        window = SendWindow(size)
+        seqno = 2 ** 32 - 5000
+        acks = 0
+        start = time.perf_counter()
+        while acks < 200000:
+            while len(window) < size:
+                window.append(Segment(seqno, (seqno + 1000) % 2 ** 32))
+                seqno = (seqno + 1000) % 2 ** 32
+            # ack the oldest segment, as it happen without loss
+            data_segment = window[window.index(window[0].expected_seqno)]
+            data_segment.acked = True
+            window.first_non_acked()
+            window.slide()
+            acks += 1
+        cost = (time.perf_counter() - start) / acks * 1e6
+        print(f'window {size:>6} segments: {cost:.2f} us per ack')
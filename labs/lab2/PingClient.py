@@ -1,40 +1,171 @@
-# python3 
-import socket      
-import time      
-
-HOST_IP = '127.0.0.1'
-HOST_PORT = 8000    
-
-
-address = (HOST_IP, HOST_PORT)    
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-s.settimeout(1)
-response = []
-
-for i in range(1, 16):
-    message = "PING {} {} \r\n".format(i, time)
-    sendTime = time.time()
-    s.sendto(message.encode(), address)
-    rtt = 0
-
-    try:
-        s.recv(1024)
-        backTime = time.time()
-        rtt = int((backTime - sendTime) * 1000)
-        print ("ping to 127.0.0.1, seq = %d, rtt = %d ms" % (i, rtt))
-        response.append(rtt)
-
-    except socket.timeout:
-        print ("ping to 127.0.0.1, seq = %d, time out" % (i))
-    continue
-
-print("min rtt: %d, max rtt: %d, average rtt: %d" % (min(response), 
-                                                    max(response), 
-                                                    sum(response)/len(response)))
-
-
-
-
-
-
+# python3
+# Usage: python3 PingClient.py [host:port ...] [--count 15] [--rate 1] [--timeout 1] [--report SECONDS] [--quiet]
+# every probe is "PING seq time" and the server echoes it back, the probes are sent at a fixed rate
+# without waiting for the replies, so many of them are in flight and the replies are matched by seq
+import socket
+import time
+import argparse
+import threading
+
+HOST_IP = '127.0.0.1'
+HOST_PORT = 8000
+
+NS_PER_MS = 1000000
+
+# seconds the receiver waits for a reply before it checks the probes which timed out
+SWEEP_INTERVAL = 0.05
+
+
+class Stats:
+    def __init__(self):
+        '''
+        The probes of one target resolved in one report, by a reply or by their timeout,
+        the ones still in flight go in the next report.
+        '''
+        self.lost = 0
+        self.late = 0  # replies which came after their timeout
+        self.rtts = {}  # seq -> rtt in ns
+
+    # the nearest-rank percentile of the sorted rtts, in ms
+    @staticmethod
+    def percentile(rtts, p):
+        return rtts[max(0, -(-len(rtts) * p // 100) - 1)] / NS_PER_MS
+
+    # RFC 3550 interarrival jitter over the rtts in seq order, in ms
+    def jitter(self):
+        jitter = 0
+        previous = None
+        for seq in sorted(self.rtts):
+            if previous is not None:
+                jitter += (abs(self.rtts[seq] - previous) - jitter) / 16
+            previous = self.rtts[seq]
+        return jitter / NS_PER_MS
+
+    def summary(self, target):
+        received = len(self.rtts)
+        sent = received + self.lost
+        loss = self.lost / sent * 100 if sent else 0
+        lines = ["--- %s:%d ---" % target,
+                 "sent %d, received %d, loss %.1f%%, late %d" % (sent, received, loss, self.late)]
+        if received:
+            rtts = sorted(self.rtts.values())
+            lines.append("min rtt: %.3f ms, max rtt: %.3f ms, average rtt: %.3f ms"
+                         % (rtts[0] / NS_PER_MS, rtts[-1] / NS_PER_MS, sum(rtts) / received / NS_PER_MS))
+            lines.append("p50: %.3f ms, p90: %.3f ms, p99: %.3f ms, jitter: %.3f ms"
+                         % (self.percentile(rtts, 50), self.percentile(rtts, 90), self.percentile(rtts, 99),
+                            self.jitter()))
+        return "\n".join(lines)
+
+
+def parseTarget(text):
+    host, _, port = text.rpartition(':')
+    return (socket.gethostbyname(host or HOST_IP), int(port))
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('targets', nargs='*', type=parseTarget, default=[(HOST_IP, HOST_PORT)],
+                    help='host:port of each ping server, all of them are probed together')
+parser.add_argument('--count', type=int, default=15, help='probes per target, 0 to run until interrupted')
+parser.add_argument('--rate', type=float, default=1, help='probes per second per target')
+parser.add_argument('--timeout', type=float, default=1, help='seconds before a probe is counted as lost')
+parser.add_argument('--report', type=float, default=0, help='print the stats every SECONDS and start new ones')
+parser.add_argument('--quiet', action='store_true', help='no line per probe')
+args = parser.parse_args()
+
+s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+s.settimeout(SWEEP_INTERVAL)
+
+stats = {target: Stats() for target in args.targets}
+# probes waiting for their reply, (target, seq) -> send time in ns
+pending = {}
+lock = threading.Lock()
+sending = True
+
+
+# count as lost the probes waiting for longer than the timeout, now=None counts every probe left
+def sweep(now):
+    expired = []
+    with lock:
+        # the probes are in sending order, stop at the first one still in time
+        for key, sendTime in pending.items():
+            if now is not None and now - sendTime <= args.timeout * 1e9:
+                break
+            expired.append(key)
+        for key in expired:
+            del pending[key]
+            stats[key[0]].lost += 1
+    if not args.quiet:
+        for target, seq in expired:
+            print ("ping to %s, seq = %d, time out" % (target[0], seq))
+
+
+def receive():
+    nextSweep = time.perf_counter_ns()
+    while sending or pending:
+        try:
+            data, target = s.recvfrom(1024)
+            backTime = time.perf_counter_ns()
+        except socket.timeout:
+            sweep(time.perf_counter_ns())
+            nextSweep = time.perf_counter_ns() + SWEEP_INTERVAL * 1e9
+            continue
+        except OSError:
+            # an unreachable target, its probes time out
+            continue
+        fields = data.split()
+        if len(fields) < 2 or fields[0] != b'PING' or not fields[1].isdigit():
+            continue
+        seq = int(fields[1])
+        with lock:
+            if target not in stats:
+                continue
+            sendTime = pending.pop((target, seq), None)
+            if sendTime is None:
+                stats[target].late += 1
+                continue
+            rtt = backTime - sendTime
+            stats[target].rtts[seq] = rtt
+        if not args.quiet:
+            print ("ping to %s, seq = %d, rtt = %.3f ms" % (target[0], seq, rtt / NS_PER_MS))
+        if backTime >= nextSweep:
+            sweep(backTime)
+            nextSweep = backTime + SWEEP_INTERVAL * 1e9
+
+
+receiver = threading.Thread(target=receive, daemon=True)
+receiver.start()
+
+interval = int(1e9 / args.rate)
+nextSend = time.perf_counter_ns()
+nextReport = nextSend + int(args.report * 1e9)
+i = 0
+try:
+    while args.count == 0 or i < args.count:
+        i += 1
+        for target in args.targets:
+            message = "PING {} {} \r\n".format(i, time.time())
+            with lock:
+                pending[(target, i)] = time.perf_counter_ns()
+            s.sendto(message.encode(), target)
+        nextSend += interval
+        if args.report and nextSend >= nextReport:
+            # the probes still in flight count in the next report
+            for target in args.targets:
+                with lock:
+                    report, stats[target] = stats[target], Stats()
+                print(report.summary(target))
+            nextReport += int(args.report * 1e9)
+        delay = nextSend - time.perf_counter_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+except KeyboardInterrupt:
+    pass
+
+# wait for the last replies, the probes still without one are lost
+sending = False
+receiver.join(args.timeout + 2 * SWEEP_INTERVAL)
+sweep(None)
+
+for target in args.targets:
+    print(stats[target].summary(target))
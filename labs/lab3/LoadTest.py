@@ -0,0 +1,79 @@
+#Python3
+# Usage: python3 LoadTest.py [port] [path] [requests per client] [clients ...]
+# every client keeps one connection open and sends its requests one after another on it
+from socket import *
+import sys
+import threading
+import time
+
+serverPort = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+requestPath = sys.argv[2] if len(sys.argv) > 2 else '/index.html'
+requestsPerClient = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+clientCounts = [int(arg) for arg in sys.argv[4:]] or [1, 2, 4, 8, 16, 32]
+
+
+# read one response, return its status and if the server keeps the connection open
+def readResponse(clientSocket, buffer):
+    while b'\r\n\r\n' not in buffer:
+        data = clientSocket.recv(65536)
+        if not data:
+            raise ConnectionError('connection closed by the server')
+        buffer += data
+    head, _, rest = bytes(buffer).partition(b'\r\n\r\n')
+    buffer[:] = rest
+    lines = head.decode('iso-8859-1').split('\r\n')
+    length = 0
+    keepAlive = True
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+        elif name.strip().lower() == 'connection':
+            keepAlive = value.strip().lower() != 'close'
+    while len(buffer) < length:
+        data = clientSocket.recv(65536)
+        if not data:
+            raise ConnectionError('connection closed by the server')
+        buffer += data
+    del buffer[:length]
+    return int(lines[0].split(" ")[1]), keepAlive
+
+
+def connect():
+    clientSocket = socket(AF_INET, SOCK_STREAM)
+    clientSocket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+    clientSocket.connect(('localhost', serverPort))
+    return clientSocket
+
+
+def client(results):
+    request = ("GET %s HTTP/1.1\r\nHost: localhost:%d\r\n\r\n" % (requestPath, serverPort)).encode()
+    clientSocket = connect()
+    buffer = bytearray()
+    errors = 0
+    for i in range(requestsPerClient):
+        clientSocket.sendall(request)
+        status, keepAlive = readResponse(clientSocket, buffer)
+        if status != 200:
+            errors += 1
+        # the server closes after its max requests per connection, open a new one
+        if not keepAlive:
+            clientSocket.close()
+            clientSocket = connect()
+            buffer = bytearray()
+    clientSocket.close()
+    results.append(errors)
+
+
+for clients in clientCounts:
+    results = []
+    threads = [threading.Thread(target=client, args=(results,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = clients * requestsPerClient
+    print('%3d clients: %6d requests in %.2f s, %8.0f requests/s, %d errors'
+          % (clients, total, elapsed, total / elapsed, sum(results) + (clients - len(results)) * requestsPerClient))
@@ -1,49 +1,431 @@
-#Python3
-from socket import *
-import os.path
-
-serverPort = 8000
-
-serverSocket = socket(AF_INET, SOCK_STREAM)
-
-serverSocket.bind(('localhost', serverPort))
-
-serverSocket.listen(1)
-
-print ("The server is ready to receive")
-
-while True:
-    connectionSocket, addr = serverSocket.accept()    
-    # get request 
-    request = connectionSocket.recv(1024).decode('utf-8')
-    request_list = request.split(" ")
-    request_path = request_list[1]
-    request_file = request_path.strip('/')
-
-    if not os.path.isfile(request_file):
-        response_line = "HTTP/1.1 404 Not Found\r\n"
-        connectionSocket.send(response_line.encode("utf-8"))
-
-    if (request_file == "index.html"):
-        with open(request_file, "rb") as file:
-            file_data = file.read()
-        response_line = "HTTP/1.1 200 OK\r\n"
-        response_header = "Content-Type: text/html\r\n"
-        response_body = file_data
-        response = (response_line +
-                        response_header +
-                        "\r\n").encode("utf-8") + response_body
-        connectionSocket.send(response)
-
-    elif(request_file == "myimage.png"):
-        with open(request_file, "rb") as file:
-            file_data = file.read()
-        response_line = "HTTP/1.1 200 OK\r\n"
-        response_header = "Content-Type: image/png\r\n"
-        response_body = file_data
-        response = (response_line +
-                        response_header +
-                        "\r\n").encode("utf-8") + response_body
-        connectionSocket.send(response)
-
-    connectionSocket.close()
+#Python3
+# Usage: python3 WebServer.py [port] [workers] [documentRoot]
+from socket import *
+import os.path
+import stat as statModule
+import sys
+import email.utils
+import mimetypes
+import threading
+import selectors
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from socket import MSG_MORE  # the headers wait for the start of the file in the same packet
+except ImportError:
+    MSG_MORE = 0
+
+serverPort = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+
+# requests served at the same time, the next ones wait in the pool queue
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+# seconds an idle keep-alive connection stays open, a request head must arrive within it
+keepAliveTimeout = 5
+
+# seconds a worker waits for the body of a request once its head has arrived
+requestTimeout = 5
+
+# seconds a worker waits for the next request of a connection before it goes back to the main thread
+keepAliveGrace = 0.01
+
+# requests served on one connection before we close it
+maxKeepAliveRequests = 1000
+
+# a request head larger than this is refused
+maxHeaderSize = 8192
+
+# every file under this directory is served
+documentRoot = os.path.realpath(sys.argv[3] if len(sys.argv) > 3 else '.')
+
+# files up to this size are kept in memory with their headers, the larger ones go with sendfile
+maxCachedFile = 256 * 1024
+
+# total bytes of the responses held in memory
+cacheSize = 32 * 1024 * 1024
+
+reasons = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           431: 'Request Header Fields Too Large'}
+
+
+class ResponseCache:
+    def __init__(self, capacity):
+        '''
+        LRU cache of the responses to small files, each entry holds the status line and the file
+        headers already encoded and the file itself, it is dropped once the file changes.
+        :param capacity: max bytes held by the entries
+        '''
+        self.capacity = capacity
+        self.size = 0
+        self.entries = OrderedDict()  # path -> (mtime_ns, file size, head, body)
+        self.lock = threading.Lock()
+
+    # the entry of path if the file has not changed since it was cached
+    def get(self, path, stat):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                self.remove(path)
+                return None
+            self.entries.move_to_end(path)
+            return entry
+
+    def put(self, path, entry):
+        with self.lock:
+            if path in self.entries:
+                self.remove(path)
+            self.entries[path] = entry
+            self.size += len(entry[2]) + len(entry[3])
+            # drop the least recently used entries
+            while self.size > self.capacity:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, path):
+        entry = self.entries.pop(path)
+        self.size -= len(entry[2]) + len(entry[3])
+
+
+cache = ResponseCache(cacheSize)
+
+
+class BadRequest(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+class Connection:
+    def __init__(self, connectionSocket):
+        '''
+        A client connection between its requests, it waits in the selector of the main thread
+        and only goes to a worker once a whole request head has arrived.
+        :param connectionSocket: the accepted socket
+        '''
+        self.socket = connectionSocket
+        self.buffer = bytearray()  # bytes received and not read as a request yet
+        self.served = 0
+        self.idleSince = time.monotonic()
+
+
+# recv which gives up once deadline (time.monotonic) has passed, even if the client keeps sending
+def receive(connectionSocket, size, deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise timeout('request timed out')
+    connectionSocket.settimeout(remaining)
+    return connectionSocket.recv(size)
+
+
+# read one request head, it may come in several recv, the bytes after it stay in buffer
+# return (method, path, version, headers) or None when the client closed the connection
+def readRequest(connectionSocket, buffer, deadline):
+    while b'\r\n\r\n' not in buffer:
+        if len(buffer) > maxHeaderSize:
+            raise BadRequest(431)
+        data = receive(connectionSocket, 4096, deadline)
+        if not data:
+            return None
+        buffer += data
+    head, _, rest = bytes(buffer).partition(b'\r\n\r\n')
+    buffer[:] = rest
+    lines = head.decode('iso-8859-1').split('\r\n')
+    request_list = lines[0].split(" ")
+    if len(request_list) != 3:
+        raise BadRequest(400)
+    method, request_path, version = request_list
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    # skip the body, our pages do not take one
+    length = headers.get('content-length', '0')
+    if not length.isdigit():
+        raise BadRequest(400)
+    length = int(length)
+    while len(buffer) < length:
+        data = receive(connectionSocket, min(length - len(buffer), 65536), deadline)
+        if not data:
+            return None
+        buffer += data
+    del buffer[:length]
+    return method, request_path, version, headers
+
+
+# HTTP/1.1 keeps the connection unless the client asks to close it, HTTP/1.0 the other way round
+def isKeepAlive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+
+# the headers which depend on the connection, they end the response head
+connectionHeaders = {
+    True: ("Connection: keep-alive\r\n" +
+           "Keep-Alive: timeout=%d, max=%d\r\n" % (keepAliveTimeout, maxKeepAliveRequests) +
+           "\r\n").encode("utf-8"),
+    False: "Connection: close\r\n\r\n".encode("utf-8"),
+}
+
+
+def getConnectionHeader(keepAlive):
+    return connectionHeaders[keepAlive]
+
+
+def sendResponse(connectionSocket, status, contentType, body, keepAlive, withBody=True):
+    response_line = "HTTP/1.1 %d %s\r\n" % (status, reasons[status])
+    response_header = ("Content-Type: %s\r\n" % contentType +
+                       "Content-Length: %d\r\n" % len(body))
+    response = (response_line + response_header).encode("utf-8") + getConnectionHeader(keepAlive)
+    connectionSocket.sendall(response + body if withBody else response)
+
+
+# the path of the file under the document root and its stat, (None, None) if there is no such file
+def getFile(request_path):
+    request_file = os.path.normpath(os.path.join(documentRoot, request_path.split('?')[0].lstrip('/')))
+    # nothing above the document root
+    if request_file != documentRoot and not request_file.startswith(documentRoot + os.sep):
+        return None, None
+    try:
+        stat = os.stat(request_file)
+        if statModule.S_ISDIR(stat.st_mode):
+            request_file = os.path.join(request_file, 'index.html')
+            stat = os.stat(request_file)
+    except OSError:
+        return None, None
+    if not statModule.S_ISREG(stat.st_mode):
+        return None, None
+    return request_file, stat
+
+
+def getEtag(stat):
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+# the status line and the headers of a file, without the connection headers
+def getFileHead(request_file, stat, size):
+    contentType = mimetypes.guess_type(request_file)[0] or 'application/octet-stream'
+    response_line = "HTTP/1.1 200 OK\r\n"
+    response_header = ("Content-Type: %s\r\n" % contentType +
+                       "Content-Length: %d\r\n" % size +
+                       "Last-Modified: %s\r\n" % email.utils.formatdate(stat.st_mtime, usegmt=True) +
+                       "ETag: %s\r\n" % getEtag(stat))
+    return (response_line + response_header).encode("utf-8")
+
+
+# the client already has this version of the file, If-None-Match wins over If-Modified-Since
+def isNotModified(headers, stat):
+    ifNoneMatch = headers.get('if-none-match')
+    if ifNoneMatch is not None:
+        tags = [tag.strip() for tag in ifNoneMatch.split(',')]
+        return '*' in tags or getEtag(stat) in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    ifModifiedSince = headers.get('if-modified-since')
+    if ifModifiedSince is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(ifModifiedSince).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def handleRequest(connectionSocket, method, request_path, headers, keepAlive):
+    if method not in ['GET', 'HEAD']:
+        sendResponse(connectionSocket, 405, 'text/plain', b'405 Method Not Allowed', keepAlive)
+        return
+    request_file, stat = getFile(request_path)
+    if request_file is None:
+        sendResponse(connectionSocket, 404, 'text/plain', b'404 Not Found', keepAlive, method == 'GET')
+        return
+    if isNotModified(headers, stat):
+        response_line = "HTTP/1.1 304 Not Modified\r\n"
+        response_header = ("Last-Modified: %s\r\n" % email.utils.formatdate(stat.st_mtime, usegmt=True) +
+                           "ETag: %s\r\n" % getEtag(stat))
+        connectionSocket.sendall((response_line + response_header).encode("utf-8") + getConnectionHeader(keepAlive))
+        return
+    if stat.st_size <= maxCachedFile:
+        sendCachedFile(connectionSocket, method, request_file, stat, keepAlive)
+    else:
+        sendLargeFile(connectionSocket, method, request_file, keepAlive)
+
+
+# a small file is sent from the cache, with its headers, in one call
+def sendCachedFile(connectionSocket, method, request_file, stat, keepAlive):
+    entry = cache.get(request_file, stat)
+    if entry is None:
+        with open(request_file, "rb") as file:
+            stat = os.fstat(file.fileno())
+            file_data = file.read()
+        entry = (stat.st_mtime_ns, len(file_data), getFileHead(request_file, stat, len(file_data)), file_data)
+        # the file changed while we read it, do not keep it
+        if len(file_data) == stat.st_size:
+            cache.put(request_file, entry)
+    response = entry[2] + getConnectionHeader(keepAlive)
+    connectionSocket.sendall(response + entry[3] if method == 'GET' else response)
+
+
+# a large file goes from the page cache to the socket with sendfile, it is never copied in python
+def sendLargeFile(connectionSocket, method, request_file, keepAlive):
+    with open(request_file, "rb") as file:
+        stat = os.fstat(file.fileno())
+        response = getFileHead(request_file, stat, stat.st_size) + getConnectionHeader(keepAlive)
+        if method != 'GET':
+            connectionSocket.sendall(response)
+            return
+        connectionSocket.sendall(response, MSG_MORE)
+        connectionSocket.sendfile(file, 0, stat.st_size)
+
+
+# a busy client sends its next request as soon as it has the response, wait keepAliveGrace
+# for its head, False if it has not come and the connection should wait in the main thread
+def waitForRequest(connectionSocket, buffer):
+    deadline = time.monotonic() + keepAliveGrace
+    try:
+        while b'\r\n\r\n' not in buffer and len(buffer) <= maxHeaderSize:
+            data = receive(connectionSocket, 4096, deadline)
+            if not data:
+                # readRequest finds the connection closed
+                return True
+            buffer += data
+    except timeout:
+        return False
+    return True
+
+
+# serve the requests of one connection while they keep coming, then give it back to the main
+# thread to wait for the next ones, it is closed once the client or the server ends it
+def handleConnection(connection, idleConnections):
+    connectionSocket = connection.socket
+    connectionSocket.settimeout(requestTimeout)
+    try:
+        while True:
+            connection.served += 1
+            try:
+                request = readRequest(connectionSocket, connection.buffer, time.monotonic() + requestTimeout)
+            except BadRequest as error:
+                sendResponse(connectionSocket, error.status, 'text/plain',
+                             ('%d %s' % (error.status, reasons[error.status])).encode(), False)
+                break
+            if request is None:
+                break
+            method, request_path, version, headers = request
+            keepAlive = isKeepAlive(version, headers) and connection.served < maxKeepAliveRequests
+            connectionSocket.settimeout(requestTimeout)
+            handleRequest(connectionSocket, method, request_path, headers, keepAlive)
+            if not keepAlive:
+                break
+            if not waitForRequest(connectionSocket, connection.buffer):
+                connectionSocket.setblocking(False)
+                idleConnections.put(connection)
+                return
+    except (timeout, OSError):
+        pass
+    connectionSocket.close()
+
+
+class IdleConnections:
+    def __init__(self):
+        '''
+        The connections the workers give back to the main thread, a byte on the wake up socket
+        tells its selector to take them.
+        '''
+        self.queue = queue.SimpleQueue()
+        self.wakeup, self.notify = socketpair()
+        self.wakeup.setblocking(False)
+        self.notify.setblocking(False)
+
+    def put(self, connection):
+        self.queue.put(connection)
+        try:
+            self.notify.send(b'\0')
+        except BlockingIOError:
+            # the wake up socket is full, the main thread is woken up already
+            pass
+
+    # every connection given back since the last call
+    def take(self):
+        try:
+            while self.wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        connections = []
+        while not self.queue.empty():
+            connections.append(self.queue.get())
+        return connections
+
+
+# read what a waiting connection received, it goes to a worker once it has a whole request head
+def readConnection(selector, connection, pool, idleConnections):
+    try:
+        data = connection.socket.recv(4096)
+    except BlockingIOError:
+        return
+    except OSError:
+        data = b''
+    if not data:
+        selector.unregister(connection.socket)
+        connection.socket.close()
+        return
+    connection.buffer += data
+    if b'\r\n\r\n' in connection.buffer or len(connection.buffer) > maxHeaderSize:
+        selector.unregister(connection.socket)
+        pool.submit(handleConnection, connection, idleConnections)
+
+
+# close the connections without a whole request head keepAliveTimeout after their last response
+def closeIdleConnections(selector):
+    now = time.monotonic()
+    for key in list(selector.get_map().values()):
+        if isinstance(key.data, Connection) and now - key.data.idleSince > keepAliveTimeout:
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+
+
+# the main thread waits for new connections and for the requests of the idle ones with a selector,
+# the workers only serve the requests which have arrived, an idle or slow client holds no worker
+def serveForever(serverSocket, pool):
+    serverSocket.setblocking(False)
+    idleConnections = IdleConnections()
+    selector = selectors.DefaultSelector()
+    selector.register(serverSocket, selectors.EVENT_READ)
+    selector.register(idleConnections.wakeup, selectors.EVENT_READ)
+    nextSweep = time.monotonic() + 1
+    while True:
+        for key, events in selector.select(timeout=1):
+            if key.fileobj is serverSocket:
+                try:
+                    connectionSocket, addr = serverSocket.accept()
+                except BlockingIOError:
+                    continue
+                connectionSocket.setblocking(False)
+                # every response is written whole, do not hold its last packet back
+                connectionSocket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+                selector.register(connectionSocket, selectors.EVENT_READ, Connection(connectionSocket))
+            elif key.fileobj is idleConnections.wakeup:
+                for connection in idleConnections.take():
+                    connection.idleSince = time.monotonic()
+                    selector.register(connection.socket, selectors.EVENT_READ, connection)
+            else:
+                readConnection(selector, key.data, pool, idleConnections)
+        if time.monotonic() >= nextSweep:
+            closeIdleConnections(selector)
+            nextSweep = time.monotonic() + 1
+
+
+if __name__ == '__main__':
+    serverSocket = socket(AF_INET, SOCK_STREAM)
+    serverSocket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+
+    serverSocket.bind(('localhost', serverPort))
+
+    serverSocket.listen(128)
+
+    print ("The server is ready to receive")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        serveForever(serverSocket, pool)